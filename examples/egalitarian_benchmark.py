@@ -0,0 +1,71 @@
+import random
+import sys
+import time
+from maniplib import data_preparation as dp
+from maniplib import egalitarian as eg
+from maniplib.manipulation_utils import *
+
+def egalitarian_rebuilding(l, k, r, rankmaps, utilities):
+	'''
+	previous egalitarian_manipulation, building a new model for every z, p and b
+	'''
+	num_cand = len(utilities[0])
+	context = ManipulationContext(l, rankmaps, utilities)
+	score_map = context.scoremap
+	score_index = context.score_index
+	T, T_count, candidates = get_types(utilities)
+
+	max_S = []
+	max_ut = 0
+	for z in range(min(score_map.values()), max(score_map.values())+r+1):
+		num_plus = score_index.count_above(z)
+		if num_plus >= k:
+			continue
+		for p in range(k-num_plus):
+			for b in range(k-num_plus-p, num_cand-num_plus-p+1):
+				solution = eg.ILP_optimistic(z, p, b, r, l, candidates, T, score_map, score_index)
+				if solution == None:
+					continue
+				S = get_strength_order_lex(eg.merge_scoremaps(score_map, solution))[:k]
+				ut = egalitarian(S, utilities, r)
+				if ut > max_ut:
+					max_S = S
+					max_ut = ut
+	return max_ut, max_S
+
+if __name__ == '__main__':
+
+	# a local copy of the election can be given instead of downloading it
+	if len(sys.argv) > 1:
+		candmap, profile, numvoters = dp.dataset_from_file(sys.argv[1])
+	else:
+		sf_12 = "http://www.preflib.org/data/election/sf/ED-00021-00000014.toc" # san fransisco 2012 election dataset
+		candmap, profile, numvoters = dp.dataset_from_url(sf_12, cache=True)
+
+	random.seed(0)
+	rebuild_time = 0
+	reuse_time = 0
+	stats = {}
+
+	for r in (2, 3):
+		utilities = dp.utilities_borda_random(profile, r, len(candmap))
+		non_manip = dp.get_nonmanipulative_votes(profile, utilities)
+
+		for l in (1, 2, 3):
+			for k in (1, 2, 4):
+				start = time.perf_counter()
+				reference = egalitarian_rebuilding(l, k, r, non_manip, utilities)
+				rebuild_time += time.perf_counter() - start
+
+				start = time.perf_counter()
+				X, eval_v, S, replaced = eg.egalitarian_manipulation(l, k, r, non_manip, utilities, stats=stats)
+				reuse_time += time.perf_counter() - start
+
+				assert eval_v == reference[0] or not reference[1], (r, l, k)
+
+	print("model per iteration %.2fs, model per z %.2fs (%.1fx)" % (rebuild_time, reuse_time, rebuild_time/reuse_time))
+	print("%d models built in %.2fs, %d solves in %.2fs" % (stats["egalitarian_models"], stats["egalitarian_build_seconds"],
+		stats["egalitarian_solves"], stats["egalitarian_solve_seconds"]))
+	print("%.1f variables and %.1f constraints per model" % (stats["egalitarian_variables"]/stats["egalitarian_models"],
+		stats["egalitarian_constraints"]/stats["egalitarian_models"]))
+	print("%d iterations ruled out without a solver" % stats.get("egalitarian_filtered", 0))
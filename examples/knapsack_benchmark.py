@@ -0,0 +1,95 @@
+import copy
+import random
+import time
+from maniplib import knapsack
+
+def e_kkp_lists(n, k, W, P, c):
+	'''
+	previous list based implementation of knapsack.e_kkp, copying both tables after every item
+	'''
+	U = knapsack.approx(k, P)
+
+	Y = [[c+1 for l in range(k+1)] for q in range(U+1)]
+	Y[0][0] = 0
+	Y_j = copy.deepcopy(Y)
+
+	chosen = [[[] for l in range(k+1)] for q in range(U+1)]
+	chosen_j = copy.deepcopy(chosen)
+
+	for j in range(n):
+		for l in range(1, k+1):
+			for q in range(P[j], U+1):
+				new = Y[q-P[j]][l-1] + W[j]
+				if Y[q][l] > new:
+					Y_j[q][l] = new
+					chosen_j[q][l] = [j]
+					chosen_j[q][l].extend(chosen[q-P[j]][l-1])
+
+		Y = copy.deepcopy(Y_j)
+		chosen = copy.deepcopy(chosen_j)
+
+	for q in range(U, 0, -1):
+		if Y[q][k] <= c:
+			return chosen[q][k]
+
+	return None
+
+def random_instance(rnd, n, k, r, max_value):
+	'''
+	knapsack instance shaped like the ones of manipulation, weights between 1 and r
+	'''
+	W = [rnd.randint(1, r) for j in range(n)]
+	P = [rnd.randint(0, max_value) for j in range(n)]
+	c = rnd.randint(k, r*k)
+	return n, k, W, P, c
+
+if __name__ == '__main__':
+
+	rnd = random.Random(0)
+
+	# all implementations have to choose the same items, including ties between items of the same value
+	for i in range(500):
+		instance = random_instance(rnd, rnd.randint(1, 12), rnd.randint(1, 4), rnd.randint(1, 5), rnd.choice([3, 20]))
+		reference = e_kkp_lists(*instance)
+		for engine in knapsack.ENGINES:
+			assert knapsack.e_kkp(*instance, engine=engine) == reference, instance
+	print("500 random instances solved identically")
+
+	# utilities summed over many manipulators make the value bound U large
+	for n, k, max_value in [(20, 3, 200), (40, 5, 400), (60, 8, 800)]:
+		instance = random_instance(rnd, n, k, 40, max_value)
+		U = knapsack.approx(k, instance[3])
+
+		times = {}
+		results = []
+		for engine in knapsack.ENGINES:
+			start = time.perf_counter()
+			results.append(knapsack.e_kkp(*instance, engine=engine))
+			times[engine] = time.perf_counter() - start
+
+		start = time.perf_counter()
+		reference = e_kkp_lists(*instance)
+		list_time = time.perf_counter() - start
+
+		assert all(result == reference for result in results)
+		print("n=%d k=%d U=%d c=%d: lists %.3fs, profit %.4fs (%.0fx), weight %.4fs (%.0fx), chosen %s" % (n, k, U, instance[4],
+			list_time, times["profit"], list_time/times["profit"], times["weight"], list_time/times["weight"], knapsack.choose_engine(k, instance[2], instance[3], instance[4])))
+
+	# coarse utilities, e.g. of utilities_borda_random_udiff with a small udiff, make many candidates interchangeable
+	for n, k, r, levels in [(100, 10, 3, 2), (300, 20, 4, 3), (600, 40, 5, 3)]:
+		W = [rnd.randint(1, r) for j in range(n)]
+		P = [r*rnd.randint(0, levels-1) for j in range(n)]
+		c = rnd.randint(k, r*k)
+
+		start = time.perf_counter()
+		chosen = knapsack.e_kkp(n, k, W, P, c)
+		item_time = time.perf_counter() - start
+
+		stats = {}
+		start = time.perf_counter()
+		grouped = knapsack.e_kkp_grouped(n, k, W, P, c, stats=stats)
+		group_time = time.perf_counter() - start
+
+		assert grouped == chosen
+		print("n=%d k=%d: items %.4fs, %d parts %.4fs (%.0fx)" % (n, k, item_time,
+			n - stats.get("knapsack_items_grouped", 0), group_time, item_time/group_time))
@@ -5,15 +5,15 @@ from maniplib import consistent_manipulation as cm
 if __name__ == '__main__':
 	
 	sf_12 = "http://www.preflib.org/data/election/sf/ED-00021-00000014.toc" # san fransisco 2012 election dataset
-	candmap, rankmaps, numvoters = dp.dataset_from_url(sf_12) # download and read election data
+	candmap, profile, numvoters = dp.dataset_from_url(sf_12, cache=True) # download and read election data, reused on later runs
 
 	r = 40 # specify the number of manipulators
 	numcandidates = len(candmap)
-	utilities = dp.utilities_borda_random(rankmaps, r, numcandidates)
+	utilities = dp.utilities_borda_random(profile, r, numcandidates)
 
 	l = 6 # specify parameter of l-Bloc rule
 	k = 5 # specify number of winning candidates
-	non_manip = dp.get_nonmanipulative_votes(rankmaps, utilities) # removing manipulative votes from the rankmaps
+	non_manip = dp.get_nonmanipulative_votes(profile, utilities) # removing manipulative votes from the profile
 	candidates_to_approve, eval_value, candidates_winning, num_candidates_replaced = cm.consistent_manipulation(l, k, non_manip, utilities, mu.utilitarian)
 
 	# iterate over candidates_to_approve to obtain the name by using candmap
@@ -0,0 +1,147 @@
+import concurrent.futures
+import numpy as np
+from multiprocessing import shared_memory
+from maniplib.manipulation_utils import *
+from maniplib.profile import as_utilities
+from maniplib import consistent_manipulation as cm
+from maniplib import inconsistent_manipulation as im
+from maniplib.sweep import VARIANTS
+from maniplib.solvers import LICENSED, default_backend
+
+# votes, utilities and contexts of a worker process, set up by init_worker
+worker_state = {}
+
+def share_array(array):
+	'''
+	copy an array into a new shared memory block
+
+	:param array: array to share (numpy.ndarray)
+
+	:returns: shared memory block and the spec (name, shape, dtype) to attach to it
+	:rtype: tuple (SharedMemory, tuple)
+	'''
+	# blocks can't be empty
+	shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+	np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+	return shm, (shm.name, array.shape, array.dtype.str)
+
+def attach_array(spec):
+	'''
+	attach to an array shared by share_array without copying it
+
+	:param spec: name, shape and dtype of the shared array (tuple)
+
+	:returns: shared memory block and the array backed by it, the block has to be kept as long as the array is used
+	:rtype: tuple (SharedMemory, numpy.ndarray)
+	'''
+	name, shape, dtype = spec
+	shm = shared_memory.SharedMemory(name=name)
+	return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def init_worker(ranks_spec, counts_spec, candidates, depth, keep_candidates, values_spec, manipulators):
+	'''
+	attach a worker process to the shared votes and utilities
+	'''
+	ranks_shm, ranks = attach_array(ranks_spec)
+	counts_shm, counts = attach_array(counts_spec)
+	values_shm, values = attach_array(values_spec)
+
+	worker_state["shared"] = [ranks_shm, counts_shm, values_shm]
+	worker_state["profile"] = Profile(ranks, counts, candidates, depth, keep_candidates)
+	worker_state["utilities"] = Utilities(values, manipulators)
+	worker_state["contexts"] = {}
+	worker_state["value_maps"] = {}
+
+def solve_task(task, profile, utilities, contexts, value_maps):
+	'''
+	solve one manipulation, contexts are shared by all tasks with the same l
+
+	:param task: variant, l, k and evaluation function, None for the egalitarian variant (tuple)
+	:param profile: nonmanipulative votes (Profile)
+	:param utilities: manipulators utilities (Utilities)
+	:param contexts: contexts built so far by l (dict)
+	:param value_maps: candidate values by evaluation function (dict)
+
+	:returns: result of the manipulation
+	:rtype: tuple (X, eval, S, replaced)
+	'''
+	variant, l, k, eval_f = task
+
+	if l not in contexts:
+		contexts[l] = ManipulationContext(l, profile, utilities, value_maps)
+	context = contexts[l]
+
+	if variant == "egalitarian":
+		# only imported by processes running egalitarian tasks
+		from maniplib import egalitarian as eg
+		return eg.egalitarian_manipulation(l, k, len(utilities[0]), profile, utilities, context)
+	if variant == "consistent":
+		return cm.consistent_manipulation(l, k, profile, utilities, eval_f, context)
+	return im.manipulation(l, k, profile, utilities, eval_f, context)
+
+def run_task(task):
+	'''
+	solve one manipulation in a worker process
+	'''
+	return solve_task(task, worker_state["profile"], worker_state["utilities"], worker_state["contexts"], worker_state["value_maps"])
+
+def run_batch(non_manip_rankmaps, utilities, tasks, workers=None, solver_workers=1, chunksize=1):
+	'''
+	solve many manipulations of the same votes and manipulators in process pools
+	the rank matrix, counts and utilities are placed in shared memory once instead of being sent with every task
+	egalitarian tasks solved by a solver needing a license, see solvers.default_backend, run in a separate pool of solver_workers processes
+
+	:param non_manip_rankmaps: rankmaps of nonmanipulative votes (list of dicts or Profile)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
+	:param tasks: (variant, l, k, eval_f) per manipulation, variant is "consistent", "inconsistent" or "egalitarian" and eval_f is ignored for egalitarian (list of tuples)
+	:param workers: number of worker processes, one per cpu if omitted, 1 solves in this process (int)
+	:param solver_workers: number of worker processes for egalitarian tasks of a licensed solver (int)
+	:param chunksize: number of tasks sent to a worker at once (int)
+
+	:returns: result (X, eval, S, replaced) of every task, in order of the tasks
+	:rtype: generator of tuples
+	'''
+	tasks = list(tasks)
+	for task in tasks:
+		if task[0] not in VARIANTS:
+			raise ValueError("unknown manipulation variant %s" % task[0])
+
+	profile = as_profile(non_manip_rankmaps)
+	utilities = as_utilities(utilities)
+
+	if workers == 1:
+		contexts = {}
+		value_maps = {}
+		for task in tasks:
+			yield solve_task(task, profile, utilities, contexts, value_maps)
+		return
+
+	shared = [share_array(profile.ranks), share_array(profile.counts), share_array(utilities.values)]
+	initargs = (shared[0][1], shared[1][1], profile.candidates, profile.depth, profile.keep_candidates, shared[2][1], utilities.manipulators)
+
+	# the workers inherit the environment choosing the solver
+	licensed = default_backend() in LICENSED
+	solver_tasks = [task for task in tasks if licensed and task[0] == "egalitarian"]
+	other_tasks = [task for task in tasks if not (licensed and task[0] == "egalitarian")]
+
+	executor = concurrent.futures.ProcessPoolExecutor(workers, initializer=init_worker, initargs=initargs)
+	solver_executor = None
+	if solver_tasks:
+		solver_executor = concurrent.futures.ProcessPoolExecutor(solver_workers, initializer=init_worker, initargs=initargs)
+
+	try:
+		# both pools return their results in order of submission, so merging them restores the task order
+		results = executor.map(run_task, other_tasks, chunksize=chunksize)
+		solver_results = solver_executor.map(run_task, solver_tasks) if solver_executor else iter(())
+
+		for task in tasks:
+			yield next(solver_results if licensed and task[0] == "egalitarian" else results)
+	finally:
+		# stop pending tasks if the caller raised or stopped iterating early
+		executor.shutdown(cancel_futures=True)
+		if solver_executor:
+			solver_executor.shutdown(cancel_futures=True)
+
+		for shm, spec in shared:
+			shm.close()
+			shm.unlink()
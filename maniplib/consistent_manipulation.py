@@ -1,70 +1,80 @@
+import heapq
 from maniplib.manipulation_utils import *
 
-def get_distinguished_cand(c, r, l, non_manip_rankmaps, strength_order):
+def get_distinguished_cand(c, r, l, non_manip_rankmaps, strength_order, context=None):
 	'''
 	get candidates that can be stronger than c by adding r manipulative votes ordered by strength
 
 	:param c: dropped candidate index (int)
 	:param r: number of manipulators (int)
 	:param l: parameter of l-bloc rule (int)
-	:param non_manip_rankmaps: preflib format for voters rankings (list of dicts)
-	:param strength_order: ordering of the candidates according to nonmanipulative votes (list)
+	:param non_manip_rankmaps: preflib format for voters rankings (list of dicts or Profile)
+	:param strength_order: ordering of the candidates according to nonmanipulative votes (list or StrengthOrder)
+	:param context: precomputed scores of the nonmanipulative votes, built if omitted (ManipulationContext)
 
-	:returns: distinguished candidates
+	:returns: distinguished candidates, the list is shared through the context and must not be modified
 	:rtype: list
 	'''
-	D = []
-
-	scores = get_score_map(l, non_manip_rankmaps)
-	sc = scores[c]
-
-	# TODO: optimization by not checking kept candidates in the first place
-	# iterate over strength order to keep order in distiguished candidates
-	for can in strength_order:
-		# add cand if has same score as dropped candidate and is weaker by lex tb
-		if scores[can] == sc and can > c:
-			D.append(can)
-		# add candidate if r votes make him stronger than c
-		if scores[can] < sc and scores[can]+r > sc:
-			D.append(can)
-		# check lex tie breaking if cand (with r manip votes) and c have the same score
-		if scores[can]+r == sc and can < c:
-			D.append(can)
-
+	if context is None:
+		context = ManipulationContext(l, non_manip_rankmaps)
+
+	# the candidates only depend on c and r, runs sharing a context compute them once
+	if (c, r) in context.distinguished:
+		return context.distinguished[c, r]
+
+	score_index = context.score_index
+	sc = context.scoremap[c]
+
+	if r == 0:
+		# candidates with the same score as c keep their lex order
+		D = score_index.at_before(sc, c) + score_index.at_after(sc, c)
+	else:
+		# the index returns every part in strength order, so D stays ordered by strength
+		# cands with same score as dropped candidate that are weaker by lex tb
+		D = score_index.at_after(sc, c)
+		# cands that r votes make stronger than c
+		D.extend(score_index.between(sc-r, sc))
+		# cands that reach the score of c with r votes and win the lex tie breaking
+		D.extend(score_index.at_before(sc-r, c))
+
+	context.distinguished[c, r] = D
 	return D
 
-def get_most_valuable(n, utilities, D, eval_f):
+def get_most_valuable(n, utilities, D, eval_f, context=None, exclude=None):
 	'''
 	extracts n most valuable candidates according to the evaluation function
+	candidates with the same value are taken in the order of D, in the strength order if a context is given
 
 	:param n: number of most valuable caniddates to be extracted (int)
-	:param utilities: manipulators utilities {manipulator_index:utility} (list)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
 	:param D: candidate indices to extract from (list)
 	:param eval_f: evaluation function (function)
+	:param context: cached candidate ranking, values are computed if omitted (ManipulationContext)
+	:param exclude: candidates of D that must not be extracted (set)
 
 	:returns: most valuable candidates indices
 	:rtype: list
 	'''
-	valuable = []
+	if exclude:
+		D = [d for d in D if d not in exclude]
 
 	if n > len(D):
-		return valuable
-
-	utilities_v = {}
-
-	# calculate utility value according to eval_f
-	for i in D:
-		utilities_v[i] = eval_f([i], utilities)
-
-	# find n candidates with max utilitiy values
-	for i in range(n):
-		m = max(utilities_v.keys(), key=(lambda key: utilities_v[key]))
-		valuable.append(m)
-		utilities_v[m] = 0
-
-	return valuable
-
-def get_manip_kegroup(r, k, X, l, non_manip_rankmaps):
+		return []
+
+	# rank candidates by value, ties in order of D
+	if context is not None:
+		key = context.value_ranks(eval_f).__getitem__
+	else:
+		values = {i: eval_f([i], utilities) for i in D}
+		first = {}
+		for pos, i in enumerate(D):
+			first.setdefault(i, pos)
+		key = lambda i: (-values[i], first[i])
+
+	# select the n best without sorting all of D
+	return heapq.nsmallest(n, D, key=key)
+
+def get_manip_kegroup(r, k, X, l, non_manip_rankmaps, context=None):
 	'''
 	calculates winning kegroup after manipulative votes casted consistently according to X (needed to compute manipulators utility)
 
@@ -72,19 +82,17 @@ def get_manip_kegroup(r, k, X, l, non_manip_rankmaps):
 	:param k: winning egroup size (int)
 	:param X: optimal set of supported candidates for given t of kept candidates (list)
 	:param l: parameter of bloc-rule (int)
-	:param non_manip_rankmaps: preflib format for voters rankings (list of dicts)
+	:param non_manip_rankmaps: preflib format for voters rankings (list of dicts or Profile)
+	:param context: precomputed scores of the nonmanipulative votes, built if omitted (ManipulationContext)
 
 	:returns: size-k set of co-winning candidates
 	:rtype: list
 	'''
-	scores = get_score_map(l, non_manip_rankmaps)
-
-	for can in X:
-		scores[can]+=r
+	if context is None:
+		context = ManipulationContext(l, non_manip_rankmaps)
 
-	strength_order = get_strength_order_lex(scores)
-
-	return strength_order[:k]
+	# only the candidates in X gain r approvals, all others keep their order
+	return context.boosted_top(X, r, k)
 
 def get_p(k, diff, X, strength_order):
 	'''
@@ -93,27 +101,30 @@ def get_p(k, diff, X, strength_order):
 	:param k: winning egroup size (int)
 	:param diff: how many candidates needed to complete l votes (int)
 	:param X: optimal set of supported candidates for given t of kept candidates (list)
-	:param strength_order: ordering of the candidates according to nonmanipulative votes (list)
+	:param strength_order: ordering of the candidates according to nonmanipulative votes (list or StrengthOrder)
 	
 	:returns: number of candidates "kicked out"
 	:rtype: int
 	'''
+	strength_order = as_strength_order(strength_order)
+	X_set = set(X)
+
 	# choose diff weakest candidates from C\X and keep their indices in strength order
-	A = [can for can in strength_order if can not in X][-diff:]
+	A = [can for can in strength_order if can not in X_set][-diff:]
 	A.extend(X)
 
 	# sort A by strength order
-	A.sort(key=lambda can: strength_order.index(can))
+	A.sort(key=strength_order.index)
 
 	# choose k strongest candidates from A+X
 	B = A[:k]
 	
 	# how many valuable candidates from X get kicked out
-	p = len([b for b in B if b not in X])
+	p = len([b for b in B if b not in X_set])
 
 	return p
 
-def optimal_supported_cand(k, l, t, D, strength_order, utilities, eval_f):
+def optimal_supported_cand(k, l, t, D, strength_order, utilities, eval_f, context=None):
 	'''
 	finds an optimal supported candidate set for a given t of kept candidates
 
@@ -121,15 +132,16 @@ def optimal_supported_cand(k, l, t, D, strength_order, utilities, eval_f):
 	:param l: parameter of l-bloc rule (int)
 	:param t: number of kept candidates (int)
 	:param D: set of distinguished candidates (list)
-	:param strength_order: ordering of the candidates according to nonmanipulative votes (list)
-	:param utilities: manipulators utilities {manipulator_index:utility} (list)
+	:param strength_order: ordering of the candidates according to nonmanipulative votes (list or StrengthOrder)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
 	:param eval_f: evaluation function e.g. utilitarian (function)
+	:param context: cached candidate values, values are computed if omitted (ManipulationContext)
 
 	:returns: optimal set of supported candidates for given t of kept candidates (list)
 	:rtype: list
 	'''
 	# k-t most valuable candidates from D
-	X = get_most_valuable(k-t, utilities, D, eval_f)
+	X = get_most_valuable(k-t, utilities, D, eval_f, context)
 
 	# add stronger candidates that hopefully don't influence the choice of other candidates in X
 	arb = min(t, l-len(X))
@@ -142,24 +154,25 @@ def optimal_supported_cand(k, l, t, D, strength_order, utilities, eval_f):
 		p = get_p(k, diff, X, strength_order)
 
 		# add p most valuable candidates from D\X
-		D_del_X = [d for d in D if d not in X]
-		X.extend(get_most_valuable(p, utilities, D_del_X, eval_f))
+		X.extend(get_most_valuable(p, utilities, D, eval_f, context, set(X)))
 		
 		if diff-p != 0:
 			# add diff-p weakest candidates of C\X to X
-			X.extend([can for can in strength_order if can not in X][-(diff-p):])
+			X_set = set(X)
+			X.extend([can for can in strength_order if can not in X_set][-(diff-p):])
 
 	return X
 
-def consistent_manipulation(l, k, non_manip_rankmaps, utilities, eval_f):
+def consistent_manipulation(l, k, non_manip_rankmaps, utilities, eval_f, context=None):
 	'''
 	finds a manipulation where manipulators vote consistently (if there is any)
 
 	:param l: parameter of l-bloc rule (int)
 	:param k: winning egroup size (int)
-	:param non_manip_rankmaps: rankmaps of nonmanipulative votes
-	:param utilities: manipulators utilities {manipulator_index:utility} (list)
+	:param non_manip_rankmaps: rankmaps of nonmanipulative votes (list of dicts or Profile)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
 	:param eval_f: evaluation function (finction)
+	:param context: precomputed data of the votes and utilities to reuse, e.g. from a sweep (ManipulationContext)
 
 	:returns:
 		* **X** – list of l candidates that the manipulators have to support
@@ -171,9 +184,10 @@ def consistent_manipulation(l, k, non_manip_rankmaps, utilities, eval_f):
 	# manipulator's count
 	r = len(utilities[0])
 
-	# determine strength order
-	scoremap = get_score_map(l, non_manip_rankmaps)
-	strength_order = get_strength_order_lex(scoremap)
+	# scores, strength order and candidate values are computed once and shared by all iterations
+	if context is None:
+		context = ManipulationContext(l, non_manip_rankmaps, utilities)
+	strength_order = context.strength_order
 
 	# prepare search for max utility
 	max_eval = 0
@@ -187,17 +201,17 @@ def consistent_manipulation(l, k, non_manip_rankmaps, utilities, eval_f):
 		dropped_can = strength_order[t]
 
 		# compute distinguished candidates that can still win with manipulative votes
-		D = get_distinguished_cand(dropped_can, r, l, non_manip_rankmaps, strength_order)
+		D = get_distinguished_cand(dropped_can, r, l, non_manip_rankmaps, strength_order, context)
 
 		# skip iteration if D is not big enough
 		if(len(D) < k-t):
 			continue
 
 		# determine optimal supported candidate set for this interation's t
-		X = optimal_supported_cand(k, l, t, D, strength_order, utilities, eval_f)
+		X = optimal_supported_cand(k, l, t, D, strength_order, utilities, eval_f, context)
 
 		# determine manipulators satisfaction
-		S = get_manip_kegroup(r, k, X, l, non_manip_rankmaps)
+		S = get_manip_kegroup(r, k, X, l, non_manip_rankmaps, context)
 		eval_v = eval_f(S, utilities)
 
 		# check if manipulators' satisfaction is maximal
@@ -1,7 +1,16 @@
 from maniplib.preflibtools import PreflibUtils as pu
-import requests
+from maniplib.profile import Profile, Utilities, as_profile, replace_file
+from maniplib.http_cache import DownloadCache, get_session
+import numpy as np
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
 import io
 import random
+import shutil
+import tempfile
 
 def merge_rankmap_counts(rankmaps, rankmapcounts):
 	'''
@@ -21,176 +30,378 @@ def merge_rankmap_counts(rankmaps, rankmapcounts):
 
 	return new_rankmaps
 
-def dataset_from_url(url):
+def read_profile(inputfile, l=None):
+	'''
+	read a dataset in preflib format record by record into a profile, without keeping a rankmap per vote
+
+	:param inputfile: file object positioned at the beginning of the dataset
+	:param l: only keep the first l ranks of every vote (int)
+
+	:returns:
+		* **candmap** – mapping from candidate indices to candidate names (dict)
+		* **profile** – unique votes weighted by the number of voters casting them (Profile)
+		* **numvoters** – number of voters (int)
+	:rtype: tuple (candmap, profile, numvoters)
+	'''
+	candmap, numvoters, sumvotes, uniqueorders = pu.read_election_header(inputfile)
+
+	# the leading votes are read completely until every candidate has appeared, so the columns are in the same order as without l
+	records = pu.iter_election_records(inputfile, uniqueorders, l, len(candmap))
+	profile = Profile.from_records(records, uniqueorders, len(candmap), depth=l)
+
+	# some candidate never appeared, so every vote was read completely
+	if len(profile.candidates) < len(candmap):
+		profile.depth = None
+
+	if profile.numvoters != sumvotes:
+		raise ValueError("votes not accounted for, expected %d but read %d" % (sumvotes, profile.numvoters))
+
+	return candmap, profile, numvoters
+
+def dataset_from_url(url, l=None, cache=None):
 	'''
 	read a dataset from an url
+	with a cache the response is stored on disk and only downloaded again if it changed on the server, the parsed profile is cached beside it
 
 	:param url: adress of the data ressource conforming to the specified format (str)
+	:param l: only keep the first l ranks of every vote, see dataset_from_file (int)
+	:param cache: download cache, True for the default cache (DownloadCache or bool)
 
 	:returns:
 		* **candmap** – mapping from candidate indices to candidate names (dict)
-		* **rankmaps** – candidate to rank mapping per voter, duplicates removed (list of dicts)
+		* **profile** – unique votes weighted by the number of voters casting them (Profile)
 		* **numvoters** – number of voters (int)
-	:rtype: tuple (candmap, rankmaps, rankmapcounts)
+	:rtype: tuple (candmap, profile, numvoters)
 	'''	
-	req = requests.get(url)
-	dataset = io.StringIO(req.text)
+	if cache is True:
+		cache = DownloadCache()
+	if cache:
+		# an unchanged download keeps its parsed profile
+		return cached_dataset(cache.fetch(url), l)
+
+	# parse the response while it is downloaded instead of buffering the whole body
+	with get_session().get(url, stream=True) as req:
+		req.raise_for_status()
+		req.raw.decode_content = True
+		req.raw.auto_close = False
+		dataset = io.TextIOWrapper(req.raw, encoding=req.encoding or "utf-8")
+
+		return read_profile(dataset, l)
+
+def dataset_from_file(path, l=None, cache=False):
+	'''
+	read a dataset from a file
+	l-bloc scores only depend on the first l ranks of every vote, if l is given the rest of every vote is skipped while parsing
+	the leading votes are still read completely until every candidate has appeared, so the candidates and their order are the same as without l
+	scoring the returned profile for a larger l raises a ValueError, utilities should be computed from a complete profile
+	removing voters raises a ValueError as well if no complete vote that is left ranks some candidate
 
-	candmap, rankmaps, rankmapcounts, numvoters = pu.read_election_file(dataset)
+	:param path: path to the data ressource file confroming to the specified format (str)
+	:param l: only keep the first l ranks of every vote (int)
+	:param cache: keep the parsed profile in a binary cache next to the file, see cached_dataset (bool)
 
-	new_rankmaps = merge_rankmap_counts(rankmaps, rankmapcounts)
-	return candmap, new_rankmaps, numvoters
+	:returns:
+		* **candmap** – mapping from candidate indices to candidate names (dict)
+		* **profile** – unique votes weighted by the number of voters casting them (Profile)
+		* **numvoters** – number of voters (int)
+	:rtype: tuple (candmap, profile, numvoters)
+	'''
+	if cache:
+		return cached_dataset(path, l)
 
-def dataset_from_file(path):
+	# records are parsed straight from the file handle
+	with open(path, "r") as f:
+		return read_profile(f, l)
+
+def load_corpus_file(path, l=None, cache=False):
 	'''
-	read a dataset from a file
+	read one file of a corpus in a worker process
+	profiles of cached files are not sent back, they are memory-mapped again by the caller
+
+	:param path: path to the data ressource file confroming to the specified format (str)
+	:param l: only keep the first l ranks of every vote (int)
+	:param cache: keep the parsed profile in a binary cache next to the file (bool)
+
+	:returns: dataset as returned by dataset_from_file, profile is None if cached
+	:rtype: tuple (candmap, profile, numvoters)
+	'''
+	candmap, profile, numvoters = dataset_from_file(path, l, cache)
+	if cache:
+		return candmap, None, numvoters
+	return candmap, profile, numvoters
+
+def load_corpus(paths, workers=None, l=None, cache=False, errors="raise"):
+	'''
+	read many files in parallel, datasets are yielded as soon as they are parsed so that they can be processed while the rest is loaded
+	files are parsed in a process pool and sent back as profiles, which only consist of the rank matrix and counts
+	with cache=True the workers build the binary cache and the datasets are memory-mapped from it instead of being sent back
+
+	:param paths: paths of the files or a glob pattern like "soc/*.soc" (list or str)
+	:param workers: number of worker processes, one per cpu if omitted, 1 parses in this process (int)
+	:param l: only keep the first l ranks of every vote (int)
+	:param cache: keep the parsed profiles in binary caches next to the files (bool)
+	:param errors: "raise" to stop at the first file that cannot be read, "skip" to leave it out or "return" to yield the exception as its dataset (str)
+
+	:returns: path and dataset (candmap, profile, numvoters) per file, in order of completion
+	:rtype: generator of tuples (path, dataset)
+	'''
+	if errors not in ("raise", "skip", "return"):
+		raise ValueError("unknown error policy %s" % errors)
+
+	if isinstance(paths, str):
+		paths = sorted(glob.glob(paths))
+
+	if workers == 1:
+		for path in paths:
+			try:
+				dataset = dataset_from_file(path, l, cache)
+			except Exception as e:
+				if errors == "raise":
+					raise
+				if errors == "return":
+					yield path, e
+				continue
+			yield path, dataset
+		return
+
+	executor = concurrent.futures.ProcessPoolExecutor(workers)
+	try:
+		futures = {executor.submit(load_corpus_file, path, l, cache): path for path in paths}
+		for future in concurrent.futures.as_completed(futures):
+			path = futures[future]
+			try:
+				candmap, profile, numvoters = future.result()
+			except Exception as e:
+				if errors == "raise":
+					raise
+				if errors == "return":
+					yield path, e
+				continue
+
+			if cache:
+				profile = cached_dataset(path, l)[1]
+			yield path, (candmap, profile, numvoters)
+	finally:
+		# stop pending files if the caller raised or stopped iterating early
+		executor.shutdown(cancel_futures=True)
+
+def file_hash(path):
+	'''
+	compute the content hash of a file
+
+	:param path: path to the file (str)
+
+	:returns: sha256 hex digest
+	:rtype: str
+	'''
+	digest = hashlib.sha256()
+	with open(path, "rb") as f:
+		for block in iter(lambda: f.read(1 << 20), b""):
+			digest.update(block)
+	return digest.hexdigest()
+
+def cached_dataset(path, l=None, cachedir=None):
+	'''
+	read a dataset from a file through a binary cache, by default the directory path + ".profile"
+	the cache keeps the rank matrix, counts and candmap keyed by the content hash of the file, loading it memory-maps the arrays instead of parsing
+	a cache of a changed file is detected by its hash and rebuilt, the hash is only recomputed if size or modification time of the file changed
+	every l has its own metadata and generations, so the cache returns the same profile as dataset_from_file
+	every build writes the arrays into a new generation directory that is never changed afterwards, replacing the metadata publishes it
+
+	:param path: path to the data ressource file confroming to the specified format (str)
+	:param l: only keep the first l ranks of every vote (int)
+	:param cachedir: directory of the cache (str)
+
+	:returns:
+		* **candmap** – mapping from candidate indices to candidate names (dict)
+		* **profile** – unique votes weighted by the number of voters casting them, memory-mapped (Profile)
+		* **numvoters** – number of voters (int)
+	:rtype: tuple (candmap, profile, numvoters)
+	'''
+	if cachedir is None:
+		cachedir = path + ".profile"
+
+	# truncated votes are cached apart from the complete ones
+	key = "complete" if l is None else "l%d" % l
+	metapath = os.path.join(cachedir, "dataset-%s.json" % key)
+	stat = os.stat(path)
+
+	meta = None
+	if os.path.exists(metapath):
+		with open(metapath, "r") as f:
+			meta = json.load(f)
+
+	if meta is not None and (meta["size"], meta["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+		# file was touched, only rebuild if its content changed
+		digest = file_hash(path)
+		if digest != meta["sha256"]:
+			meta = None
+		else:
+			meta["size"], meta["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+			replace_file(metapath, lambda f: json.dump(meta, f), "w")
+
+	if meta is not None and "generation" in meta:
+		candmap = {int(can): name for can, name in meta["candmap"].items()}
+		try:
+			return candmap, Profile.load(os.path.join(cachedir, meta["generation"])), meta["numvoters"]
+		except FileNotFoundError:
+			# the generation was removed by a concurrent rebuild, build it again
+			pass
+
+	# hash before parsing so that changes while parsing invalidate the cache
+	digest = file_hash(path)
+	candmap, profile, numvoters = dataset_from_file(path, l)
+
+	# the arrays are complete before the generation gets its final name
+	os.makedirs(cachedir, exist_ok=True)
+	building = tempfile.mkdtemp(dir=cachedir, prefix=".tmp-")
+	try:
+		profile.save(building)
+		generation = "generation-%s-%s" % (key, os.path.basename(building)[len(".tmp-"):])
+		os.rename(building, os.path.join(cachedir, generation))
+	except BaseException:
+		shutil.rmtree(building, ignore_errors=True)
+		raise
+
+	# replacing the metadata switches readers to the new generation in one step, readers of an older one never see new arrays
+	meta = {"sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "depth": l, "candmap": candmap, "numvoters": numvoters,
+		"generation": generation}
+	replace_file(metapath, lambda f: json.dump(meta, f), "w")
+
+	# readers still loading an older generation find it missing and rebuild, readers that loaded it keep their mapped arrays
+	for name in os.listdir(cachedir):
+		if name.startswith("generation-%s-" % key) and name != generation:
+			shutil.rmtree(os.path.join(cachedir, name), ignore_errors=True)
+
+	return candmap, profile, numvoters
+
+def rankcounts_from_file(path, l=None):
+	'''
+	read a dataset from a file without keeping the votes, only counting how often a candidate is ranked at each rank
+	memory does not depend on the number of voters, which allows scoring datasets that do not fit into memory
 
 	:param path: path to the data ressource file confroming to the specified format (str)
+	:param l: only count the first l ranks of every vote (int)
 
 	:returns:
 		* **candmap** – mapping from candidate indices to candidate names (dict)
-		* **rankmaps** – candidate to rank mapping per voter, duplicates removed (list of dicts)
+		* **rankcounts** – number of voters ranking a candidate at a rank {candidate:{rank:count}} (dict)
 		* **numvoters** – number of voters (int)
-	:rtype: tuple (candmap, rankmaps, numvoters)
+	:rtype: tuple (candmap, rankcounts, numvoters)
 	'''
-	f = open(path, "r")
-	dataset = io.StringIO(f.read())
+	with open(path, "r") as f:
+		return pu.aggregate_election_file(f, l)
 
-	candmap, rankmaps, rankmapcounts, numvoters = pu.read_election_file(dataset)
+def utilities_borda_voters(profile, voters, numcandidates, udiff=None):
+	'''
+	extract the utilities of the given voters by borda rule
+	
+	:param profile: count-weighted voters preferences (Profile)
+	:param voters: voter indices of the manipulators (list)
+	:param numcandidates: number of candidates (int)
+	:param udiff: number of different utility values, ranks from udiff on give utility zero (int)
 
-	new_rankmaps = merge_rankmap_counts(rankmaps, rankmapcounts)
-	return candmap, new_rankmaps, numvoters
+	:returns: manipulators utilities, one row per candidate and one column per manipulator
+	:rtype: Utilities
+	'''
+	values = np.zeros((numcandidates, len(voters)), dtype=np.int64)
+	candidates = np.asarray(profile.candidates, dtype=np.int64)
+
+	# determine max rank that is given to a candidate
+	max_utility = profile.max_rank()
+
+	for col, i in enumerate(voters):
+		ranks = profile.ranks[profile.position(i)].astype(np.int64)
+		ranked = ranks != profile.unranked
+
+		# borda rule depends on rank (e.g. 1 rank gives max utility)
+		utility = max_utility-ranks[ranked]+1
+		if udiff is not None:
+			# ranks higher than udiff are utility zero to enforce using udiff values only (including 0)
+			utility[ranks[ranked] >= udiff] = 0
+		values[candidates[ranked]-1, col] = utility
+
+	return Utilities(values, voters)
 
 def utilities_borda(rankmaps, r, numcandidates):
 	'''
 	select the first r voters from the rankmap as manipulators and extract their utilities by borda rule
 	voter_index is relative to rankmaps
 
-	:param rankmaps: candidate to rank mapping per voter (list of dicts)
+	:param rankmaps: candidate to rank mapping per voter (list of dicts or Profile)
 	:param r: number of manipulators (int)
 	:param numcandidates: number of candidates (int))
 
 	:returns: manipulators utilities {manipulator_index:utility}
-	:rtype: list
+	:rtype: Utilities
 	'''
+	profile = as_profile(rankmaps)
+
 	# check if number of manipulators feasible
-	if r > len(rankmaps):
+	if r > profile.numvoters:
 		return []
 
-	utilities = [{} for i in range(numcandidates)]
-
-	# determine max rank that is given to a candidate
-	max_utility = max([max(i.values()) for i in rankmaps])
-
-	# add utilities for the selected voters
-	for i in range(r):
-
-		# initialize utility by zero
-		for utility in utilities:
-			utility[i] = 0
-
-		# update utility if manipulators ranked the candidate
-		for cand, rank in rankmaps[i].items():
-			# borda rule depends on rank (e.g. 1 rank gives max utility)
-			utilities[cand-1][i] = max_utility-rank+1 
-
-	return(utilities)
+	return utilities_borda_voters(profile, list(range(r)), numcandidates)
 
 def utilities_borda_random(rankmaps, r, numcandidates):
 	'''
 	select the r random voters from the rankmap as manipulators and extract their utilities by borda rule
 	voter_index is relative to rankmaps
 
-	:param rankmaps: candidate to rank mapping per voter (list of dicts)
+	:param rankmaps: candidate to rank mapping per voter (list of dicts or Profile)
 	:param r: number of manipulators (int)
 	:param numcandidates: number of candidates (int)
 
 	:returns: manipulators utilities {manipulator_index:utility}
-	:rtype: list
+	:rtype: Utilities
 	'''	
+	profile = as_profile(rankmaps)
+
 	# check if number of manipulators is feasible
-	if r > len(rankmaps):
+	if r > profile.numvoters:
 		return -1
-		
-	utilities = [{} for i in range(numcandidates)]
-	# determine max rank that is given to a candidate
-	max_utility = max([max(i.values()) for i in rankmaps])
 
 	# add utilities for the randomly selected voters
-	for i in random.sample(range(len(rankmaps)), r):
-
-		# initialize utility by zero
-		for utility in utilities:
-			utility[i] = 0
-
-		# update utility if manipulators ranked the candidate
-		for cand, rank in rankmaps[i].items():
-			# borda rule depends on rank (e.g. 1 rank gives max utility)
-			utilities[cand-1][i] = max_utility-rank+1	
-
-	return(utilities)
+	return utilities_borda_voters(profile, random.sample(range(profile.numvoters), r), numcandidates)
 
 def utilities_borda_random_udiff(rankmaps, r, numcandidates, udiff):
 	'''
 	select the r random voters from the rankmap as manipulators and extract their utilities by borda rule using udiff different utility values
 	voter_index is relative to rankmaps
 
-	:param rankmaps: candidate to rank mapping per voter (list of dicts)
+	:param rankmaps: candidate to rank mapping per voter (list of dicts or Profile)
 	:param r: number of manipulators (int)
 	:param numcandidates: number of candidates (int)
 	:param udiff: number of different utility values (int)
 
 	:returns: manipulators utilities {manipulator_index:utility}
-	:rtype: list
+	:rtype: Utilities
 	'''	
+	profile = as_profile(rankmaps)
+
 	# check if number of manipulators is feasible
-	if r > len(rankmaps):
+	if r > profile.numvoters:
 		return -1
 
 	# check if udiff is feasible
 	if udiff > numcandidates:
 		return -1
-		
-	utilities = [{} for i in range(numcandidates)]
-	# determine max rank that is given to a candidate
-	max_utility = max([max(i.values()) for i in rankmaps])
 
 	# add utilities for the randomly selected voters
-	for i in random.sample(range(len(rankmaps)), r):
-
-		# initialize utility by zero
-		for utility in utilities:
-			utility[i] = 0
-
-		# update utility if manipulators ranked the candidate
-		for cand, rank in rankmaps[i].items():
-			# ranks higher than udiff are utility zero to enforce using udiff values only (including 0)
-			if rank >= udiff:
-				utilities[cand-1][i] = 0
-			else:
-				# borda rule depends on rank (e.g. 1 rank gives max utility)
-				utilities[cand-1][i] = max_utility-rank+1	
-
-	return(utilities)
+	return utilities_borda_voters(profile, random.sample(range(profile.numvoters), r), numcandidates, udiff)
 
 def get_nonmanipulative_votes(rankmaps, utilities):
 	'''
 	removes manipulative votes from manipulator's utilities from rankmaps
 
-	:param rankmaps: candidate to rank mapping per voter (list of dicts)
-	:param utilities: manipulators utilities {manipulator_index:utility} (list)
+	:param rankmaps: candidate to rank mapping per voter (list of dicts or Profile)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
 
 	:returns: candidate to rank mapping per voter without manipulators
-	:rtype: list of dicts
+	:rtype: Profile
 	'''
-	nonmanip_rankmaps = []
-
 	# get manipulators indices to filter out
 	manip_idx = utilities[0].keys()
 
-	# copy only nonmanipulative votes
-	for i in range(len(rankmaps)):
-		if i not in manip_idx:
-			nonmanip_rankmaps.append(rankmaps[i])
-
-	return nonmanip_rankmaps
\ No newline at end of file
+	# only decrease the counts of the votes casted by manipulators
+	return as_profile(rankmaps).without_voters(manip_idx)
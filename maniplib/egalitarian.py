@@ -1,6 +1,6 @@
+import time
 from maniplib.manipulation_utils import *
-
-from gurobipy import *
+from maniplib.solvers import new_model
 
 def merge_scoremaps(scoremap, solution):
 	'''
@@ -22,57 +22,48 @@ def merge_scoremaps(scoremap, solution):
 
 	return new_scoremap
 
-def get_candidate_indices(m, T, r, z, candidates, scoremap):
+def get_candidate_indices(m, T, r, z, candidates, scoremap, group_index=None):
 	'''
 	get approved candidate indices and amount of approvals from group counts
 
-	:param m: number of candidates (int)
+	:param m: solved model (MILPModel)
 	:param T: types, tuples of utility values (list)
 	:param r: number of manipulators (int)
 	:param z: lowest possible score of a winning candidate (int)
 	:param candidates: list of each candidate's type
 	:param scoremap: mapping from candidates to scores (dict)
+	:param group_index: groups of the candidates, built if omitted (GroupIndex)
 
-	:returns: number of approvals per candidate
+	:returns: number of approvals per candidate, empty if the solution approves more candidates of a group than it has
 	:rtype: dict
 	'''
+	if group_index is None:
+		group_index = GroupIndex(T, candidates, scoremap)
+
 	# init solution dict
 	solution = {}
 	for cand in range(len(scoremap)+1):
 		solution[cand] = 0
 
-	# iterate over all groups
-	for t in T:
-		i = T.index(t)
-		for j in range(r+1):
-			G = cand_in_group(t, j, z, scoremap, candidates)
-
-			# compute number of candidates from group to be approved
-			x = int(m.getVarByName("X["+str(i)+","+str(j)+"]").X)
-			x_p = int(m.getVarByName("X_p["+str(i)+","+str(j)+"]").X)
-
-			app = x + x_p
-			if app > len(G):
-				print(m.getVarByName("X["+str(i)+","+str(j)+"]"))
-				print(m.getVarByName("X_p["+str(i)+","+str(j)+"]"))
-				print("app =", app, ", len(G) =", len(G), "x =", x, "x_p =", x_p)
-				print(m.getConstrByName("X_p["+str(i)+","+str(j)+"]").rhs)
-				# print(m.getConstrByName("X_p["+str(i)+","+str(j)+"]").lhs)
-				# print(int(m.getConstrByName("X_p"+str(i)+","+str(j)).lhs))
-				# outf = open(base_path + base_file_name + str(i) + ".soc", 'w')
-				# PreflibUtils.write_map(cmap, nvoter, rankmap_to_voteset(rmaps, rmapscounts),outf)
-				# outf.close()
-				# return -1
-				return {}
-
-			# add j approvals to candidates from group that are to be approved
-			for a in range(app):
-				can = G[a]
-				solution[can] = j
+	# iterate over all groups, the model only has variables for groups with members
+	for i, j, G in group_index.nonempty(z, r):
+		# compute number of candidates from group to be approved
+		x = m.value(m.vars["X"][i, j])
+		x_p = m.value(m.vars["X_p"][i, j]) if (i, j) in m.vars["X_p"] else 0
+
+		# more approved candidates than the group has, (4) is violated and there is no solution
+		app = x + x_p
+		if app > len(G):
+			return {}
+
+		# add j approvals to candidates from group that are to be approved
+		for a in range(app):
+			can = G[a]
+			solution[can] = j
 
 	return solution
 
-def ILP_optimistic(z, p, b, r, l, candidates, T, scoremap):
+def ILP_optimistic(z, p, b, r, l, candidates, T, scoremap, score_index=None, backend=None, group_index=None):
 	'''
 	creates and solves an ILP in one iteration
 
@@ -84,71 +75,218 @@ def ILP_optimistic(z, p, b, r, l, candidates, T, scoremap):
 	:param candidates: list of each candidate's type
 	:param T: types, tuples of utility values (list)
 	:param scoremap: mapping from candidates to scores (dict)
+	:param score_index: index of scoremap, built if omitted (ScoreIndex)
+	:param backend: solver, see solvers.new_model (str)
+	:param group_index: groups of the candidates, built if omitted (GroupIndex)
 
 	:returns: number of approvals per candidate
 	:rtype: dict
 	'''
+	if group_index is None:
+		group_index = GroupIndex(T, candidates, scoremap)
+
+	m = build_optimistic_model(z, r, l, candidates, T, scoremap, score_index, group_index, backend)
+	return solve_optimistic_model(m, z, p, b, r, candidates, T, scoremap, group_index)
+
+def build_optimistic_model(z, r, l, candidates, T, scoremap, score_index=None, group_index=None, backend=None):
+	'''
+	creates the ILP of all iterations with the same z, only the right-hand sides of p and b differ between them, see solve_optimistic_model
+	variables and constraints are only added for groups G_ij with members, the variables of empty groups would be 0
+	X_p[i,r] would be 0 as well and isn't added, (4) follows from (7) for j = 0
+
+	:param z: lowest possible score of a winning candidate (int)
+	:param r: number of candidates (int)
+	:param l: parameter of l-bloc rule (int)
+	:param candidates: list of each candidate's type
+	:param T: types, tuples of utility values (list)
+	:param scoremap: mapping from candidates to scores (dict)
+	:param score_index: index of scoremap, built if omitted (ScoreIndex)
+	:param group_index: groups of the candidates, built if omitted (GroupIndex)
+	:param backend: solver, see solvers.new_model (str)
+
+	:returns: model, p and b are 0 until they are set by solve_optimistic_model
+	:rtype: MILPModel
+	'''
+	if score_index is None:
+		score_index = ScoreIndex(scoremap)
+	if group_index is None:
+		group_index = GroupIndex(T, candidates, scoremap)
 
-	# compute C+ and C- again
-	C_plus = [cand for cand in scoremap if scoremap[cand] > z]
-	C_minus = [cand for cand in scoremap if scoremap[cand] < z-r]
+	# compute sizes of C+ and C- again
+	num_plus = score_index.count_above(z)
+	num_minus = score_index.count_below(z-r)
 
-	m = Model("egalitarian")
-	m.setParam( 'OutputFlag', False)
+	groups = group_index.nonempty(z, r)
+	sizes = {(i, j): len(G) for i, j, G in groups}
 
 	# disable presolving
-	m.setParam( 'Presolve', False)
+	m = new_model("egalitarian", backend, presolve=False)
 
-	# create variables x_ij and x_ij+ for every type i and approvalnumber j
-	# x_ij are border, x_ij+ are promoted candidates
-	X_p = m.addVars(len(T), r+1, vtype = GRB.INTEGER, name = "X_p")
-	X = m.addVars(len(T), r+1, vtype = GRB.INTEGER, name = "X")
+	# create variables x_ij and x_ij+ for every non-empty group, type i and approvalnumber j
+	# x_ij are border, x_ij+ are promoted candidates, if r approvals are needed, candidate needs to be b (8)
+	# don't make more candidates b and p than are actually there (4)
+	X_p = m.add_vars([(i, j) for i, j, G in groups if j < r], "X_p", sizes)
+	X = m.add_vars([(i, j) for i, j, G in groups], "X", sizes)
 
 	# how many approvals have to be spent to get p, b
-	o = m.addVar(vtype=GRB.INTEGER, name="o")
+	o = m.add_var("o")
 	# how many remaining approvals have to be spent
-	o_bar = m.addVar(vtype=GRB.INTEGER, name="o_bar")
+	o_bar = m.add_var("o_bar")
 
 	# set constraints ensuring that values of x_ij are feasable
-	for t in T:
-		i = T.index(t)
-		for j in range(r+1):
-			G = cand_in_group(t,j,z,scoremap, candidates)
-			# don't make more candidates b and p than are actually there (4)
-			m.addConstr((len(G) >= X_p[i,j] + X[i,j]), name = "X_p["+str(i)+","+str(j)+"]")
-
-		G_0 = cand_in_group(t,0,z,scoremap, candidates)
-
-		# candidates with score z have to be p or b (7)
-		m.addConstr(X[i,0]+X_p[i,0] == len(G_0))
-
-		# if r approvals are needed, candidate needs to be b (8)
-		m.addConstr(X_p[i,r] == 0)
+	for i, j, G in groups:
+		if j == 0:
+			# candidates with score z have to be p or b (7)
+			m.add_constr([(1, X[i,0]), (1, X_p[i,0])], "==", len(G))
+		else:
+			# don't make more candidates b and p than are actually there (4), solve_optimistic_model fixes groups by its right-hand side
+			m.add_constr(group_terms(m, i, j), "<=", len(G), name = "G["+str(i)+","+str(j)+"]")
 
 	# ensure that p and b many candidates are chosen (5),(6)
-	m.addConstr(sum([sum([X[i,j] for j in range(r+1)]) for i in range(len(T))]) == b)
-	m.addConstr(sum([sum([X_p[i,j] for j in range(r+1)]) for i in range(len(T))]) == p)
+	m.add_constr([(1, var) for var in X.values()], "==", 0, name = "b")
+	m.add_constr([(1, var) for var in X_p.values()], "==", 0, name = "p")
 
 	# set constraints needed for the manipulation (9)
-	m.addConstr(sum([sum([X[i,j]*j + X_p[i,j]*(j+1) for j in range(r+1)])for i in range(len(T))]) == o)
+	m.add_constr([(j, X[i,j]) for i, j in X] + [(j+1, X_p[i,j]) for i, j in X_p] + [(-1, o)], "==", 0)
 	# only lr votes can be spent (10)
-	m.addConstr(o <= l*r)
+	m.add_constr([(1, o)], "<=", l*r)
 
 	# set constraints needed for the distribution of the remaining approvals
-	# very big equation (11)
-	safe_app = r*(len(C_plus)+len(C_minus))
-	m.addConstr(o_bar <= safe_app + sum([sum([len(cand_in_group(T[i],j,z,scoremap, candidates)) - X[i,j] - X_p[i,j] for j in range(r+1)]) for i in range(len(T))])*(j-1) + sum([sum([X_p[i,j] * (r-j-1) for j in range(r+1)]) for i in range(len(T))]))
+	# very big equation (11), the safe approvals and the sizes of the groups are its right-hand side
+	# the groups are multiplied by r-1 like in the dense model, which used j-1 with j left at r by its loop over the types
+	factor = r-1
+	safe_app = r*(num_plus+num_minus)
+	remaining = [(1, o_bar)]
+	remaining += [(factor, X[i,j]) for i, j in X]
+	remaining += [(factor - (r-j-1), X_p[i,j]) for i, j in X_p]
+	m.add_constr(remaining, "<=", safe_app + sum(sizes.values())*factor)
 
 	# sum of votes lr that have to be spent (12)
-	m.addConstr(o_bar+o == l*r)
+	m.add_constr([(1, o_bar), (1, o)], "==", l*r)
+
+	return m
+
+def group_terms(m, i, j):
+	'''
+	number of approved candidates of a group, x_ij + x_ij+
+
+	:param m: model of build_optimistic_model (MILPModel)
+	:param i: type index in T (int)
+	:param j: number of approvals needed to reach z (int)
+
+	:returns: linear expression
+	:rtype: list of tuples
+	'''
+	terms = [(1, m.vars["X"][i, j])]
+	if (i, j) in m.vars["X_p"]:
+		terms.append((1, m.vars["X_p"][i, j]))
+	return terms
+
+def optimistic_feasible(p, b, r, l, sizes, safe_app):
+	'''
+	check necessary conditions of the ILP of build_optimistic_model for p and b, an iteration failing them is infeasible without solving it
 
-	m.optimize()
+	:param p: number of promoted candidates, weaker than z, but still win (int)
+	:param b: number of border candidates, score exactly z (int)
+	:param r: number of candidates (int)
+	:param l: parameter of l-bloc rule (int)
+	:param sizes: number of candidates needing j approvals to reach z, see GroupIndex.sizes (list)
+	:param safe_app: approvals that can be given to C+ and C-, r*(|C+|+|C-|) (int)
 
-	# check if model is infeasible
-	if m.status != GRB.Status.OPTIMAL:
-		return None
-		
-	return get_candidate_indices(m, T, r, z, candidates, scoremap)
+	:returns: False if the iteration is infeasible, True if it may be feasible
+	:rtype: bool
+	'''
+	total = sum(sizes)
+
+	# candidates with score z have to be p or b (7)
+	if p + b < sizes[0]:
+		return False
+
+	# don't make more candidates b and p than are actually there (4), no candidate needing r approvals can be p (8)
+	if p + b > total or p > total - sizes[r]:
+		return False
+
+	# the p + b candidates needing the least and the most approvals, promoted candidates need one more (9)
+	cheapest = p
+	dearest = p
+	low = p + b
+	high = p + b
+	for j in range(r+1):
+		cheapest += j*min(sizes[j], low)
+		low -= min(sizes[j], low)
+		dearest += (r-j)*min(sizes[r-j], high)
+		high -= min(sizes[r-j], high)
+
+	# only lr votes can be spent (10)
+	if cheapest > l*r:
+		return False
+
+	# the approvals left after spending the most have to be distributed (11), (12)
+	# the promoted candidates add at most r-1 each to (11)
+	if l*r - min(dearest, l*r) > safe_app + (r-1)*(total - b):
+		return False
+
+	return True
+
+def solve_optimistic_model(m, z, p, b, r, candidates, T, scoremap, group_index=None):
+	'''
+	solves the ILP of build_optimistic_model for p and b, the last solution found is the start of the next solve
+	the ILP has no objective of its own, so the approved candidates are minimized group by group, starting with the types least useful to the
+	least satisfied manipulator, which makes the solution independent of the solver and of the start and leaves the winners to the useful types
+
+	:param m: model of z (MILPModel)
+	:param z: lowest possible score of a winning candidate (int)
+	:param p: number of promoted candidates, weaker than z, but still win (int)
+	:param b: number of border candidates, score exactly z (int)
+	:param r: number of candidates (int)
+	:param candidates: list of each candidate's type
+	:param T: types, tuples of utility values (list)
+	:param scoremap: mapping from candidates to scores (dict)
+	:param group_index: groups of the candidates, built if omitted (GroupIndex)
+
+	:returns: number of approvals per candidate
+	:rtype: dict
+	'''
+	if group_index is None:
+		group_index = GroupIndex(T, candidates, scoremap)
+
+	m.set_rhs("b", b)
+	m.set_rhs("p", p)
+
+	# the groups with j = 0 are fixed by (7), the others are minimized by the lowest and then the summed utility of their type,
+	# groups of the same type from the most approvals needed on
+	groups = [(i, j, G) for i, j, G in group_index.nonempty(z, r) if j > 0]
+	groups.sort(key=lambda group: (min(T[group[0]]), sum(T[group[0]]), -group[1], group[0]))
+
+	# without groups to fix the model only has to be feasible
+	m.set_objective([])
+	feasible = m.optimize() if not groups else True
+
+	fixed = []
+	for i, j, G in groups:
+		terms = group_terms(m, i, j)
+		m.set_objective(terms, maximize=False)
+
+		# check if model is infeasible, a solution stays feasible when its group is fixed
+		feasible = m.optimize()
+		if not feasible:
+			break
+
+		# keep the group at its minimum while the next groups are minimized
+		name = "G["+str(i)+","+str(j)+"]"
+		m.set_rhs(name, sum([m.value(var) for coef, var in terms]))
+		fixed.append((name, len(G)))
+
+	solution = None
+	if feasible:
+		# warm start the next p and b
+		m.warm_start()
+		solution = get_candidate_indices(m, T, r, z, candidates, scoremap, group_index)
+
+	for name, size in fixed:
+		m.set_rhs(name, size)
+
+	return solution
 
 def ILP_pessimistic():
 	return None
@@ -156,6 +294,7 @@ def ILP_pessimistic():
 def cand_in_group(t, j, z, scoremap, candidates):
 	'''
 	determine the members of a group G_i,j for given types and additional score j
+	scans all candidates, GroupIndex answers the same query with a lookup
 
 	:param t: type of a candidate (tuple)
 	:param j: group parameter (int)
@@ -181,14 +320,17 @@ def cand_in_group(t, j, z, scoremap, candidates):
 
 	return G
 
-def egalitarian_manipulation(l, k, r, rankmaps, utilities):
+def egalitarian_manipulation(l, k, r, rankmaps, utilities, context=None, stats=None, backend=None):
 	'''
 	finds a manipulation where remaining approvals can be distributed with egalitarian evaluation using ILP
 
 	:param l: parameter of l-bloc rule (int)
 	:param k: winning egroup size (int)
-	:param rankmaps: rankmaps of nonmanipulative votes
-	:param utilities: manipulators utilities {manipulator_index:utility} (list)
+	:param rankmaps: rankmaps of nonmanipulative votes (list of dicts or Profile)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
+	:param context: precomputed scores of the votes to reuse, e.g. from a sweep (ManipulationContext)
+	:param stats: number of models built and solved, their variables and constraints, the seconds spent on building and on solving them and the iterations ruled out without a solver under "egalitarian_filtered" are added to this dict (dict)
+	:param backend: solver, see solvers.new_model (str)
 
 	:returns:
 		* **X** – dict of candidates to support, {candidate:numapprovals}
@@ -199,9 +341,19 @@ def egalitarian_manipulation(l, k, r, rankmaps, utilities):
 	'''
 	# prepare loop variables
 	num_cand = len(utilities[0])
-	score_map = get_score_map(l, rankmaps)
+	if context is None:
+		context = ManipulationContext(l, rankmaps, utilities)
+	score_map = context.scoremap
 	min_score = min(score_map.values())
 	max_score = max(score_map.values())+r
+	score_index = context.score_index
+
+	# types don't change between iterations, their groups are looked up in the index
+	T, T_count, candidates = get_types(utilities)
+	group_index = GroupIndex(T, candidates, score_map)
+
+	# the model is built by the first iteration of a z, model_z is the z of the model
+	model_z = None
 
 	# init optimal k-egroup as empty
 	max_S = []
@@ -211,24 +363,43 @@ def egalitarian_manipulation(l, k, r, rankmaps, utilities):
 	# lowest possible score of a winning candidate
 	for z in range(min_score, max_score+1):
 
-		# candidates with a score higher than z
-		C_plus = [cand for cand in score_map if score_map[cand] > z]
+		# number of candidates with a score higher than z
+		num_plus = score_index.count_above(z)
 
 		# skip this iteration if there are k or more candidates winning anyways
-		if len(C_plus) >= k:
+		if num_plus >= k:
 			continue
 
+		# group populations and safe approvals rule out iterations before building the model
+		sizes = group_index.sizes(z, r)
+		safe_app = r*(num_plus+score_index.count_below(z-r))
+
 		# number of promoted candidates (weaker than z, but still win)
 		# upper bound for p: C+ and one candidate with score z is needed
 		# winning: C+, p, some of b
-		for p in range(k-len(C_plus)):
+		for p in range(k-num_plus):
 			# number of border candidates (score exactly z)
 			# m-|C+|-p >= b >= k-|C+|-p
-			for b in range(k-len(C_plus)-p, num_cand-len(C_plus)-p+1):
+			for b in range(k-num_plus-p, num_cand-num_plus-p+1):
 
-				T, T_count, candidates = get_types(utilities)
+				if not optimistic_feasible(p, b, r, l, sizes, safe_app):
+					count_stat(stats, "egalitarian_filtered")
+					continue
 
-				solution = ILP_optimistic(z, p, b, r, l, candidates, T, score_map)
+				# all iterations of z share the model, only the right-hand sides of p and b are set
+				if model_z != z:
+					start = time.perf_counter()
+					m = build_optimistic_model(z, r, l, candidates, T, score_map, score_index, group_index, backend)
+					model_z = z
+					count_stat(stats, "egalitarian_models")
+					count_stat(stats, "egalitarian_variables", m.num_vars)
+					count_stat(stats, "egalitarian_constraints", m.num_constrs)
+					count_stat(stats, "egalitarian_build_seconds", time.perf_counter() - start)
+
+				start = time.perf_counter()
+				solution = solve_optimistic_model(m, z, p, b, r, candidates, T, score_map, group_index)
+				count_stat(stats, "egalitarian_solves")
+				count_stat(stats, "egalitarian_solve_seconds", time.perf_counter() - start)
 
 				# check if model is feasible
 				if solution == None:
@@ -252,7 +423,7 @@ def egalitarian_manipulation(l, k, r, rankmaps, utilities):
 					max_sol = solution
 
 	# check if manipulation results in change of kegroup
-	strength_order = get_strength_order_lex(score_map)
+	strength_order = context.strength_order
 	replaced = check_manipul(k, max_S, strength_order)
 
 	# check if no solution was found
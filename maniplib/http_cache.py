@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+import requests
+from maniplib.profile import replace_file
+
+# pooled session shared by all downloads
+session = None
+
+def get_session():
+	'''
+	get the shared session, connections to the same host are pooled and reused
+
+	:returns: shared session
+	:rtype: requests.Session
+	'''
+	global session
+	if session is None:
+		session = requests.Session()
+	return session
+
+def default_directory():
+	'''
+	determine the default cache directory, $MANIPLIB_CACHE or ~/.cache/maniplib
+
+	:returns: path of the cache directory
+	:rtype: str
+	'''
+	return os.environ.get("MANIPLIB_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "maniplib"))
+
+class DownloadCache:
+	'''
+	persistent download cache keyed by url
+	cached responses are revalidated with conditional requests using their ETag and Last-Modified headers, so unchanged resources are not downloaded again
+
+	:param directory: cache directory, see default_directory (str)
+	:param session: session used for requests, the shared session if omitted (requests.Session)
+	:param offline: never contact the server and only serve cached responses (bool)
+	'''
+	def __init__(self, directory=None, session=None, offline=False):
+		self.directory = directory if directory is not None else default_directory()
+		self.session = session if session is not None else get_session()
+		self.offline = offline
+
+	def entry(self, url):
+		'''
+		get the directory of the cache entry of an url
+
+		:param url: adress of the ressource (str)
+
+		:returns: path of the entry directory
+		:rtype: str
+		'''
+		return os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+	def fetch(self, url):
+		'''
+		get a ressource through the cache, downloading it only if it is missing or changed on the server
+
+		:param url: adress of the ressource (str)
+
+		:returns: path of the file holding the response body
+		:rtype: str
+		'''
+		entry = self.entry(url)
+		body = os.path.join(entry, "body")
+		metapath = os.path.join(entry, "response.json")
+
+		meta = None
+		if os.path.exists(metapath) and os.path.exists(body):
+			with open(metapath, "r") as f:
+				meta = json.load(f)
+
+		if self.offline:
+			if meta is None:
+				raise FileNotFoundError("%s is not cached and the cache is offline" % url)
+			return body
+
+		# ask the server to only send the body if it changed
+		headers = {}
+		if meta is not None:
+			if meta.get("etag"):
+				headers["If-None-Match"] = meta["etag"]
+			if meta.get("last_modified"):
+				headers["If-Modified-Since"] = meta["last_modified"]
+
+		with self.session.get(url, headers=headers, stream=True) as req:
+			if req.status_code == 304 and meta is not None:
+				return body
+			req.raise_for_status()
+
+			def write_body(f):
+				for chunk in req.iter_content(1 << 16):
+					f.write(chunk)
+
+			os.makedirs(entry, exist_ok=True)
+			replace_file(body, write_body)
+
+			meta = {"url": url, "etag": req.headers.get("ETag"), "last_modified": req.headers.get("Last-Modified")}
+			replace_file(metapath, lambda f: json.dump(meta, f), "w")
+
+		return body
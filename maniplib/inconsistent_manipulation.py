@@ -1,5 +1,6 @@
-import copy
+import heapq
 from maniplib.manipulation_utils import *
+from maniplib.knapsack import *
 
 def lex(a,b):
 	'''
@@ -17,7 +18,7 @@ def lex(a,b):
 		return b
 	return 0
 
-def get_manip_kegroup(z, c, scoremap, X_res):
+def get_manip_kegroup(z, c, scoremap, X_res, score_index=None):
 	'''
 	calculates winning kegroup after manipulative votes casted according to X_res
 
@@ -25,13 +26,17 @@ def get_manip_kegroup(z, c, scoremap, X_res):
 	:param c: this iteration's least preferred egroup member index (int)
 	:param scoremap: scores for all candidates (dict)
 	:param X_res: optimal set of supported candidates for given c (list)
+	:param score_index: index of scoremap, built if omitted (ScoreIndex)
 
 	:returns: size-k set of co-winning candidates
 	:rtype: list
 	'''
-	# strongest k-k_star candidates
-	S = [cand for cand in scoremap if scoremap[cand] > z]
-	S.extend([cand for cand in scoremap if scoremap[cand] == z and lex(cand, c) == cand])
+	if score_index is None:
+		score_index = ScoreIndex(scoremap)
+
+	# strongest k-k_star candidates in scoremap order
+	S = sorted(score_index.above(z), key=score_index.positions.__getitem__)
+	S.extend(sorted(score_index.at_after(z, c), key=score_index.positions.__getitem__))
 	S.append(c)
 	S.extend(X_res)
 	return S
@@ -70,26 +75,33 @@ def distribute_remaining(r, C_star, s_star, k_star, W, X, strength_order):
 	:param k_star: number of remaining members of egroup (int)
 	:param W: weights of candidates (list)
 	:param X: supported candidates (list)
-	:param strength_order: ordering of the candidates according to nonmanipulative votes (list)
+	:param strength_order: ordering of the candidates according to nonmanipulative votes (list or StrengthOrder)
 
 	:returns: number of approvals that are impossible to distribute
 	:rtype: int
 	'''
 	# remaining approvals after spending r approvals on each candidate from X
 	remaining = s_star - r*k_star
-	safe_cand = [cand for cand in strength_order if cand not in C_star]
+	C_star_set = set(C_star)
+	safe_cand = [cand for cand in strength_order if cand not in C_star_set]
 
 	# remaining approvals after spending r approvals on each candidate from C\C*
 	remaining -= r*len(safe_cand)
 
+	# weights are identified by the first item having them
+	first = {}
+	for j, w in enumerate(W):
+		first.setdefault(w, j)
+
 	# give one approval less than needed to candidates C*\X_res
-	unapproved = [w-1 for w in W if W.index(w) not in X]
+	X_set = set(X)
+	unapproved = [w-1 for w in W if first[w] not in X_set]
 	remaining -= sum(unapproved)
 
 	return remaining
 
 
-def knapsack_parameters(k, r, l, c, z, scoremap):
+def knapsack_parameters(k, r, l, c, z, scoremap, score_index=None):
 	'''
 	compute knapsack parameters
 
@@ -99,6 +111,7 @@ def knapsack_parameters(k, r, l, c, z, scoremap):
 	:param c: this iteration's least preferred egroup member index (int)
 	:param z: score of this iteration's least preferred egroup member (int)
 	:param scoremap: scores for all candidates (dict)
+	:param score_index: index of scoremap, built if omitted (ScoreIndex)
 
 	:returns: 
 		* **k_star** – number of remaining members of egroup (int)
@@ -106,217 +119,202 @@ def knapsack_parameters(k, r, l, c, z, scoremap):
 		* **C_star** – candidates that can possibly join egroup (list)
 	:rtype: tuple (k_star, s_star, C_star)
 	'''
+	if score_index is None:
+		score_index = ScoreIndex(scoremap)
 
-	# candidates that are k-egroup members anyways
-	C_plus = [cand for cand in scoremap if scoremap[cand] > z]
-	C_plus.extend([cand for cand in scoremap if scoremap[cand] == z and lex(cand, c) == cand])
+	# number of candidates that are k-egroup members anyways
+	# (score above z or score z and winning the lex tie breaking against c)
+	num_plus = score_index.count_above(z) + len(score_index.at_after(z, c))
 
 	# check if choice of c is feasible
-	if len(C_plus) >= k:
+	if num_plus >= k:
 		return None, None, None
 
 	# compute additional approvals nedded for c
 	s = z - scoremap[c]
 
 	# compute number of remaining candidates that need to join kegroup
-	k_star = k-len(C_plus)-1
+	k_star = k-num_plus-1
 
 	# compute remaining number of approvals that manipulators can give
 	# this will be knapsack capacity
 	s_star = r*l - s
 
-	# select candidates that can possibly join kegroup
-	# this will be knapsack items
-	C_remaining = [cand for cand in scoremap if cand not in C_plus and cand != c]
-	C_star = [cand for cand in C_remaining if scoremap[cand] > z-r]
-	C_star.extend([cand for cand in C_remaining if scoremap[cand] == z-r and lex(cand, c) == cand])
+	# select candidates that can possibly join kegroup, in scoremap order followed by the candidates with score z-r
+	# this will be knapsack items, distribute_remaining depends on their order
+	C_star = score_index.at_before(z, c)
+	C_star.extend([cand for cand in score_index.between(z-r, z) if cand != c])
+	C_star.sort(key=score_index.positions.__getitem__)
+	C_star.extend(sorted(score_index.at_after(z-r, c), key=score_index.positions.__getitem__))
 
 	if len(C_star) < k_star:
 		return None, None, None
 
 	return k_star, s_star, C_star
 
-def compute_efficiency(n, W, P):
-	'''
-	computes efficiency of items in W and P
-
-	:param n: number of items (int)
-	:param W: item weights (list)
-	:param P: item values (list)
-
-	:returns: item indices ordered according to efficiency
-	:rtype: list
-	'''
-	eff = [j for j in range(n)]
-	eff.sort(key=lambda j: P[j]/W[j], reverse=True)
-
-	return eff
-
-def approx(k, P):
-	'''
-	approximates the final value of ekp by taking the sum of the k highest weighted items
-
-	:param k: number of items in solution (int)
-	:param P: item values (list)
-
-	:returns: approximation value
-	:rtype: list
-	'''
-	# sort item values descendingly
-	P_sorted = sorted(P, reverse=True)
-
-	# sum up k highest values
-	return sum(P_sorted[:k])
-
-def e_kkp(n, k, W, P, c):
-	'''
-	solves the exact k-items Knapsack Problem by dynamic programming
-
-	:param n: number of items (int)
-	:param k: number of items in solution (int)
-	:param W: item weights (list)
-	:param P: item values (list)
-	:param c: weight constraint (int)
-
-	:returns: chosen items, None if no solution is possible
-	:rtype: list, None
-	'''
-	# determine upper bound for value by using knapsack approximation
-	# U = 2*H_KP(n, k, W, P, c)
-	U = approx(k, P)
-
-	# initialize Y_0 with Y_0(0,0) = 0, other values are dummy values (above capacity)
-	Y = [[c+1 for l in range(k+1)] for q in range(U+1)]
-	Y[0][0] = 0
-
-	# initialize Y_1
-	Y_j = copy.deepcopy(Y)
-
-	# initialize data structure to remember chosen item indices
-	chosen = [[[] for l in range(k+1)] for q in range(U+1)]
-	chosen_j = copy.deepcopy(chosen)
-
-	for j in range(n):
-		# Y_j has same values as Y at this point
-
-		# l is the number of chosen items
-		for l in range(1, k+1):
-
-			# guess summed value (P) of chosen items for l and j
-			for q in range(P[j], U+1):
-				# compute new weight if item j would be added
-				new = Y[q-P[j]][l-1] + W[j]
-
-				# check if new value is an improvement and less equal c
-				if Y[q][l] > new:
-					Y_j[q][l] = new
-
-					# remember which items where chosen
-					chosen_j[q][l] = [j]
-					chosen_j[q][l].extend(chosen[q-P[j]][l-1])
-				# if value is no improvement, value from iteration before stays
-
-		# prepare Y for the next iteration
-		Y = copy.deepcopy(Y_j)
-		chosen = copy.deepcopy(chosen_j)
-
-	# find maximum q such that weight is below constraint
-	for q in range(U, 0, -1):
-		if Y[q][k] <= c:
-			return chosen[q][k]
-
-	# no solution found
-	return None
-
-def manipulation(l, k, non_manip_rankmaps, utilities, eval_f):
+def manipulation(l, k, non_manip_rankmaps, utilities, eval_f, context=None, stats=None, memo=None, epsilon=None):
 	'''
 	finds an l-Bloc manipulation for utilitarian and candidate-wise egalitarian evaluation
 
 	:param l: parameter of l-bloc rule (int)
 	:param k: winning egroup size (int)
-	:param non_manip_rankmaps: preflib format for voters rankings (list of dicts)
-	:param utilities: manipulators utilities {manipulator_index:utility} (list)
+	:param non_manip_rankmaps: preflib format for voters rankings (list of dicts or Profile)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
 	:param eval_f: evaluation function (function)
+	:param context: precomputed data of the votes and utilities to reuse, e.g. from a sweep (ManipulationContext)
+	:param stats: counters of the search, e.g. the knapsack formulations used, are added to this dict (dict)
+	:param memo: knapsack tables to reuse, e.g. shared by a sweep, a new cache is used for this call if omitted (KnapsackMemo)
+	:param epsilon: solve the knapsacks approximately with at most this relative loss of value, see e_kkp_approx, only for utilitarian and candegal. If the remaining approvals can't be distributed for the approximate choice of candidates, the knapsack is solved exactly, so the result is worth at least (1-epsilon) of the exact search (float)
 
 	:returns:
 		* **X** – set of candidates that should be suported, not necessarily size l (list)
 		* **eval** – value of eval_f of winning max_S (int)
 		* **S** – winning kegroup (list)
 		* **replaced** – number of candidates replaced (int)
-	:rtype: tuple (X, eval, S, replaced)
+		* **bound** – only with epsilon, the exact search finds no value above it (int)
+	:rtype: tuple (X, eval, S, replaced) or (X, eval, S, replaced, bound)
 	'''
+	if epsilon is not None and not is_separable(eval_f):
+		raise ValueError("approximation needs an evaluation function summing up single candidate values")
+
 	# manipulator's count
 	r = len(utilities[0])
 
-	# determine strength order
-	scoremap = get_score_map(l, non_manip_rankmaps)
+	# determine scores, strength order and candidate values once
+	if context is None:
+		context = ManipulationContext(l, non_manip_rankmaps, utilities)
+	scoremap = context.scoremap
+	strength_order = context.strength_order
+	score_index = context.score_index
 
-	strength_order = get_strength_order_lex(scoremap)
+	value_map = context.values(eval_f)
 
-	# prepare search for max utility
-	max_eval = 0
-	max_X = []
-	max_S = []
+	# neighbouring pairs often have the same items with weights shifted by one, their knapsacks share tables
+	if memo is None:
+		memo = KnapsackMemo()
 
-	value_map = {}
-	for i in range(1, len(utilities)+1):
-		value_map[i] = eval_f([i], utilities)
+	# value of the kegroup if no candidates have to be added
+	kegroup_eval = eval_f(strength_order[:k], utilities)
 
 	# fix candidate index for c, the least prefered member of the k-egroup
 	# at most r*l candidates can be supported by the manipulators, k candidates have to be considered anyways
+	pairs = []
 	for c in strength_order[:k+r*l]:
 
 		# fix final score of c
 		for z in range(scoremap[c], scoremap[c]+r):
+			index = len(pairs)
+
+			if not is_separable(eval_f):
+				pairs.append((None, index, c, z, True))
+				continue
 
 			# determine knapsack parameters
-			k_star, s_star, C_star = knapsack_parameters(k, r, l, c, z, scoremap)
+			k_star, s_star, C_star = knapsack_parameters(k, r, l, c, z, scoremap, score_index)
 
 			# check if choice of c is feasable
 			if C_star == None:
 				continue
 
-			# knapsack only has to be comuted if candidates still have to be added
+			# optimistic value: C+ and c win anyways, the k_star most valuable candidates of C* join them
 			if k_star != 0:
-				# determine item's values by evaluation function
-				P = [value_map[cand] for cand in C_star]
+				C_plus = score_index.above(z) + score_index.at_after(z, c)
+				bound = sum([value_map[cand] for cand in C_plus]) + value_map[c] + sum(heapq.nlargest(k_star, [value_map[cand] for cand in C_star]))
+			else:
+				bound = kegroup_eval
+			pairs.append((bound, index, c, z, k_star != 0))
+
+	# most promising pairs first so that good solutions are found early, the search order breaks ties
+	if is_separable(eval_f):
+		pairs.sort(key=lambda pair: (-pair[0], pair[1]))
+
+	# prepare search for max utility
+	max_eval = 0
+	max_index = -1
+	max_X = []
+	max_S = []
 
-				# weight is number of approvals needed to be in kegroup
-				W = compute_weights(scoremap, z, c, C_star)
+	# largest value the exact knapsacks could have reached
+	max_bound = 0
 
-				# compute exact k-item knapsack
-				X = e_kkp(len(C_star), k_star, W, P, s_star)
+	for num, (bound, index, c, z, knapsack) in enumerate(pairs):
 
-				# check if knapsack is feasable
-				if X == None:
-					continue
+		# solutions are taken if they are better or as good and earlier in the search order
+		if bound is not None and bound < max_eval:
+			# the pairs are sorted by bound, none of the remaining pairs can be better
+			count_stat(stats, "knapsacks_pruned", len([pair for pair in pairs[num:] if pair[4]]))
+			break
+		if bound is not None and bound == max_eval and index > max_index:
+			count_stat(stats, "knapsacks_pruned", int(knapsack))
+			continue
 
-				X_res = [C_star[x] for x in X]
-				# todo: add distribute_remaining to X
+		# determine knapsack parameters
+		k_star, s_star, C_star = knapsack_parameters(k, r, l, c, z, scoremap, score_index)
 
-				# check if remaining approvals can be distributed
-				if distribute_remaining(r, C_star, s_star, k_star, W, X, strength_order)>0:
-					continue
+		# check if choice of c is feasable
+		if C_star == None:
+			continue
 
-				# determine manipulators satisfaction
-				S = get_manip_kegroup(z, c, scoremap, X_res)
+		# knapsack only has to be comuted if candidates still have to be added
+		if k_star != 0:
+			# determine item's values by evaluation function
+			P = [value_map[cand] for cand in C_star]
 
-			# in this case this case no candidates get replaced
+			# weight is number of approvals needed to be in kegroup
+			W = compute_weights(scoremap, z, c, C_star)
+
+			# candidates of the same weight and value are interchangeable, e.g. those of the same score, side of c in the tie-breaking and utilities
+			# each class is one knapsack item with a multiplicity, its first candidates in the strength order are chosen
+			if epsilon is None:
+				# compute exact k-item knapsack, with the formulation of the smaller table
+				X = e_kkp_grouped(len(C_star), k_star, W, P, s_star, stats=stats, memo=memo)
 			else:
-				S = strength_order[:k]
-				# vote for all winning candidates
-				X_res = S
+				# the exact knapsack is worth at most knapsack_bound, C+ and c win on top of it
+				X, knapsack_bound = e_kkp_approx(len(C_star), k_star, W, P, s_star, epsilon, stats=stats, memo=memo, grouped=True)
+				fixed = sum([value_map[cand] for cand in get_manip_kegroup(z, c, scoremap, [], score_index)])
+				max_bound = max(max_bound, fixed + knapsack_bound)
+				count_stat(stats, "knapsacks_approximated")
+
+			# check if knapsack is feasable
+			if X == None:
+				continue
+
+			if epsilon is not None and fixed + knapsack_bound > max_eval and distribute_remaining(r, C_star, s_star, k_star, W, X, strength_order)>0:
+				# the approximate choice can fail where the exact one doesn't, solve exactly if that could improve the result
+				X = e_kkp_grouped(len(C_star), k_star, W, P, s_star, stats=stats, memo=memo)
+				count_stat(stats, "knapsacks_solved_exactly")
 
-			eval_v = eval_f(S, utilities)
+			X_res = [C_star[x] for x in X]
+			# todo: add distribute_remaining to X
 
-			# check if manipulators' satisfaction is maximal
-			if(eval_v > max_eval):
-				max_eval = eval_v
-				max_X = X_res.copy()
-				max_S = S.copy()
+			# check if remaining approvals can be distributed
+			if distribute_remaining(r, C_star, s_star, k_star, W, X, strength_order)>0:
+				continue
+
+			# determine manipulators satisfaction
+			S = get_manip_kegroup(z, c, scoremap, X_res, score_index)
+
+		# in this case this case no candidates get replaced
+		else:
+			S = strength_order[:k]
+			# vote for all winning candidates
+			X_res = S
+
+		eval_v = eval_f(S, utilities)
+
+		# check if manipulators' satisfaction is maximal
+		if eval_v > max_eval or (eval_v == max_eval and index < max_index):
+			max_eval = eval_v
+			max_index = index
+			max_X = X_res.copy()
+			max_S = S.copy()
 
 	# check if manipulation results in change of kegroup
 	replaced = check_manipul(k, max_S, strength_order)
 
+	# pruned pairs can't be better than max_eval
+	if epsilon is not None:
+		return max_X, max_eval, max_S, replaced, max(max_eval, max_bound)
+
 	# return X that maximizes manipulators satisfaction
 	return max_X, max_eval, max_S, replaced
\ No newline at end of file
@@ -0,0 +1,747 @@
+import collections
+import copy
+import math
+import numpy as np
+from maniplib.manipulation_utils import count_stat
+
+ENGINES = ("profit", "weight")
+
+# weight of unreachable entries in tables over values, far enough from overflowing when weights are added
+UNREACHABLE = np.iinfo(np.int64).max // 4
+
+def compute_efficiency(n, W, P):
+	'''
+	computes efficiency of items in W and P
+
+	:param n: number of items (int)
+	:param W: item weights (list)
+	:param P: item values (list)
+
+	:returns: item indices ordered according to efficiency
+	:rtype: list
+	'''
+	eff = [j for j in range(n)]
+	eff.sort(key=lambda j: P[j]/W[j], reverse=True)
+
+	return eff
+
+def approx(k, P, S=None):
+	'''
+	approximates the final value of ekp by taking the sum of the k highest weighted items
+
+	:param k: number of items in solution (int)
+	:param P: item values (list)
+	:param S: number of items each entry of P stands for, P holds their summed value (list)
+
+	:returns: approximation value
+	:rtype: list
+	'''
+	if S is not None:
+		# an entry of s items worth p are s items worth p/s each
+		total = 0
+		for p, s in sorted(zip(P, S), key=lambda item: item[0]/item[1], reverse=True):
+			take = min(s, k)
+			total += take*p // s
+			k -= take
+		return total
+
+	# sort item values descendingly
+	P_sorted = sorted(P, reverse=True)
+
+	# sum up k highest values
+	return sum(P_sorted[:k])
+
+def is_taken(parents, j, q, l, k):
+	'''
+	look up in the parent bits if item j improved the entry for q and l items
+
+	:param parents: packed parent bits, one row per item (numpy.ndarray)
+	:param j: item index (int)
+	:param q: summed value or weight the table is indexed by (int)
+	:param l: number of chosen items (int)
+	:param k: number of items in solution (int)
+
+	:returns: True if the item was taken
+	:rtype: bool
+	'''
+	# bits of an item are the entries for l = 1..k in row-major order, most significant bit first
+	bit = q*k + l-1
+	return bool(parents[j, bit >> 3] >> (7 - (bit & 7)) & 1)
+
+def relative_weights(engine, W, S=None):
+	'''
+	split item weights into a shift and weights relative to it, tables are built over the relative weights
+	l items weigh their relative weights plus l times the shift, so items whose weights only differ by a constant share their tables
+	tables over values use the first weight, tables over weights the least weight as shift to keep relative weights not negative
+
+	:param engine: "profit" or "weight" (str)
+	:param W: item weights (list)
+	:param S: number of items each entry of W stands for, W holds their summed weight, the shift is per item (list)
+
+	:returns: shift and relative weights
+	:rtype: tuple (int, list)
+	'''
+	if len(W) == 0:
+		return 0, []
+	if S is None:
+		S = [1]*len(W)
+	units = [w // s for w, s in zip(W, S)]
+	shift = units[0] if engine == "profit" else min(units)
+	return shift, [w - s*shift for w, s in zip(W, S)]
+
+def parent_bytes(rows, k):
+	'''
+	number of bytes holding the packed parent bits of one item
+
+	:param rows: number of table rows (int)
+	:param k: largest number of items in a solution (int)
+
+	:returns: number of bytes
+	:rtype: int
+	'''
+	return (rows*k+7) // 8
+
+class ProfitTable:
+	'''
+	dynamic programming table of the exact k-items Knapsack Problem over the summed values of the items
+	Y[q, l] is the least relative weight of l items with value q, an item updates all q and l at once from the rows of the item before
+	the chosen items are reconstructed from one parent bit per item and entry, items are taken over earlier items of the same weight
+	the table doesn't depend on the weight constraint and answers every number of items up to k
+	an item can stand for several items, see group_items, it then adds all of them to l
+
+	:param k: largest number of items in a solution (int)
+	:param B: relative item weights, see relative_weights (list)
+	:param P: item values, not negative (list)
+	:param S: number of items each item stands for, 1 for all if omitted (list)
+	'''
+	def __init__(self, k, B, P, S=None):
+		self.k = k
+		self.B = []
+		self.P = []
+		self.S = []
+		self.U = 0
+
+		# initialize Y_0 with Y_0(0,0) = 0, other entries can't be reached
+		self.Y = np.full((1, k+1), UNREACHABLE, dtype=np.int64)
+		self.Y[0, 0] = 0
+		self.parents = np.zeros((0, parent_bytes(1, k)), dtype=np.uint8)
+
+		self.extend(B, P, S)
+
+	def copy(self):
+		'''
+		copy the table, e.g. to extend it and keep the original
+
+		:returns: independent copy
+		:rtype: ProfitTable
+		'''
+		table = copy.copy(self)
+		table.B = list(self.B)
+		table.P = list(self.P)
+		table.S = list(self.S)
+		table.Y = self.Y.copy()
+		table.parents = self.parents.copy()
+		return table
+
+	def serves(self, k, c):
+		'''
+		check if the table can answer a query
+
+		:param k: number of items in solution (int)
+		:param c: relative weight constraint (int)
+
+		:returns: True if k is at most the table's k
+		:rtype: bool
+		'''
+		return k <= self.k
+
+	def extend(self, B, P, S=None):
+		'''
+		add items behind the items of the table
+
+		:param B: relative item weights (list)
+		:param P: item values, not negative (list)
+		:param S: number of items each item stands for, 1 for all if omitted (list)
+		'''
+		k = self.k
+		S = [1]*len(P) if S is None else list(S)
+
+		# determine upper bound for value by using knapsack approximation
+		# U = 2*H_KP(n, k, W, P, c)
+		U = approx(k, self.P + list(P), self.S + S)
+
+		# no k items of the table are worth more than its old bound, so the new rows can't be reached yet
+		if U > self.U:
+			self.Y = np.concatenate([self.Y, np.full((U-self.U, k+1), UNREACHABLE, dtype=np.int64)])
+			self.parents = np.pad(self.parents, ((0, 0), (0, parent_bytes(U+1, k) - self.parents.shape[1])))
+			self.U = U
+
+		Y = self.Y
+		Y_j = np.empty_like(Y)
+		parents = np.zeros((len(P), parent_bytes(U+1, k)), dtype=np.uint8)
+		taken = np.zeros((U+1, k), dtype=bool)
+
+		for j, (b, p, s) in enumerate(zip(B, P, S)):
+			if p > U or s > k:
+				continue
+
+			# weight of every entry if item j would be added to the entry with s items less and value q-p
+			source = Y[:U+1-p, :k+1-s]
+			new = source + b
+
+			# only strict improvements replace the entry, the value from the iteration before stays otherwise
+			improved = (source != UNREACHABLE) & (new < Y[p:, s:])
+			np.copyto(Y_j, Y)
+			np.copyto(Y_j[p:, s:], new, where=improved)
+
+			# remember which entries took item j
+			taken[:p] = False
+			taken[p:, :s-1] = False
+			taken[p:, s-1:] = improved
+			parents[j] = np.packbits(taken, axis=None)
+
+			# prepare Y for the next iteration
+			Y, Y_j = Y_j, Y
+
+		self.Y = Y
+		self.parents = np.concatenate([self.parents, parents])
+		self.B.extend(B)
+		self.P.extend(P)
+		self.S.extend(S)
+
+	def solve(self, k, c):
+		'''
+		find the most valuable k items within the weight constraint
+
+		:param k: number of items in solution, at most the table's k (int)
+		:param c: relative weight constraint, the constraint minus k times the shift (int)
+
+		:returns: chosen items in descending order, None if no solution with a positive value is possible
+		:rtype: list, None
+		'''
+		U = approx(k, self.P, self.S)
+
+		# find maximum q such that weight is below constraint
+		weights = self.Y[1:U+1, k]
+		feasible = np.flatnonzero((weights != UNREACHABLE) & (weights <= c))
+		if len(feasible) == 0:
+			# no solution found
+			return None
+		q = int(feasible[-1]) + 1
+
+		# walk back through the items, the last item taken for an entry comes first
+		chosen = []
+		l = k
+		for j in range(len(self.P)-1, -1, -1):
+			if l > 0 and is_taken(self.parents, j, q, l, self.k):
+				chosen.append(j)
+				q -= self.P[j]
+				l -= self.S[j]
+
+		return chosen
+
+class WeightTable:
+	'''
+	dynamic programming table of the exact k-items Knapsack Problem over the summed relative weights of the items
+	V[w, l] is the largest value of l items with relative weight w, it is built and reconstructed like ProfitTable
+	among the most valuable solutions the lightest is chosen, which gives the same items as ProfitTable
+
+	:param k: largest number of items in a solution (int)
+	:param B: relative item weights, not negative, see relative_weights (list)
+	:param P: item values, not negative (list)
+	:param capacity: largest relative weight constraint the table answers (int)
+	:param S: number of items each item stands for, 1 for all if omitted (list)
+	'''
+	def __init__(self, k, B, P, capacity, S=None):
+		self.k = k
+		self.capacity = max(capacity, -1)
+		self.B = []
+		self.P = []
+		self.S = []
+
+		# -1 marks weights that can't be reached with l items
+		self.V = np.full((self.capacity+1, k+1), -1, dtype=np.int64)
+		if self.capacity >= 0:
+			self.V[0, 0] = 0
+		self.parents = np.zeros((0, parent_bytes(self.capacity+1, k)), dtype=np.uint8)
+
+		self.extend(B, P, S)
+
+	def copy(self):
+		'''
+		copy the table, e.g. to extend it and keep the original
+
+		:returns: independent copy
+		:rtype: WeightTable
+		'''
+		table = copy.copy(self)
+		table.B = list(self.B)
+		table.P = list(self.P)
+		table.S = list(self.S)
+		table.V = self.V.copy()
+		table.parents = self.parents.copy()
+		return table
+
+	def serves(self, k, c):
+		'''
+		check if the table can answer a query
+
+		:param k: number of items in solution (int)
+		:param c: relative weight constraint (int)
+
+		:returns: True if k and c are at most the table's k and capacity
+		:rtype: bool
+		'''
+		return k <= self.k and c <= self.capacity
+
+	def extend(self, B, P, S=None):
+		'''
+		add items behind the items of the table
+
+		:param B: relative item weights, not negative (list)
+		:param P: item values, not negative (list)
+		:param S: number of items each item stands for, 1 for all if omitted (list)
+		'''
+		k = self.k
+		c = self.capacity
+		S = [1]*len(P) if S is None else list(S)
+
+		V = self.V
+		V_j = np.empty_like(V)
+		parents = np.zeros((len(P), self.parents.shape[1]), dtype=np.uint8)
+		taken = np.zeros((c+1, k), dtype=bool)
+
+		for j, (b, p, s) in enumerate(zip(B, P, S)):
+			if b > c or s > k:
+				continue
+
+			# value of every entry if item j would be added to the entry with s items less and weight w-b
+			source = V[:c+1-b, :k+1-s]
+			new = source + p
+
+			# only strict improvements replace the entry
+			improved = (source >= 0) & (new > V[b:, s:])
+			np.copyto(V_j, V)
+			np.copyto(V_j[b:, s:], new, where=improved)
+
+			taken[:b] = False
+			taken[b:, :s-1] = False
+			taken[b:, s-1:] = improved
+			parents[j] = np.packbits(taken, axis=None)
+
+			V, V_j = V_j, V
+
+		self.V = V
+		self.parents = np.concatenate([self.parents, parents])
+		self.B.extend(B)
+		self.P.extend(P)
+		self.S.extend(S)
+
+	def solve(self, k, c):
+		'''
+		find the most valuable k items within the weight constraint
+
+		:param k: number of items in solution, at most the table's k (int)
+		:param c: relative weight constraint, the constraint minus k times the shift, at most the table's capacity (int)
+
+		:returns: chosen items in descending order, None if no solution with a positive value is possible
+		:rtype: list, None
+		'''
+		if c < 0:
+			return None
+
+		# most valuable solution, the lightest one if several weights reach it
+		values = self.V[:c+1, k]
+		best = int(values.max())
+		if best < 1:
+			# no solution found
+			return None
+		w = int(np.flatnonzero(values == best)[0])
+
+		chosen = []
+		l = k
+		for j in range(len(self.P)-1, -1, -1):
+			if l > 0 and is_taken(self.parents, j, w, l, self.k):
+				chosen.append(j)
+				w -= self.B[j]
+				l -= self.S[j]
+
+		return chosen
+
+def e_kkp_profit(n, k, W, P, c, S=None):
+	'''
+	solves the exact k-items Knapsack Problem by dynamic programming over the summed values of the items, see ProfitTable
+
+	:param n: number of items (int)
+	:param k: number of items in solution (int)
+	:param W: item weights (list)
+	:param P: item values, not negative (list)
+	:param c: weight constraint (int)
+	:param S: number of items each item stands for, W and P hold their summed weights and values (list)
+
+	:returns: chosen items in descending order, None if no solution with a positive value is possible
+	:rtype: list, None
+	'''
+	S = S[:n] if S is not None else None
+	shift, B = relative_weights("profit", W[:n], S)
+	return ProfitTable(k, B, P[:n], S=S).solve(k, c - k*shift)
+
+def e_kkp_weight(n, k, W, P, c, S=None):
+	'''
+	solves the exact k-items Knapsack Problem by dynamic programming over the summed weights of the items, see WeightTable
+
+	:param n: number of items (int)
+	:param k: number of items in solution (int)
+	:param W: item weights (list)
+	:param P: item values, not negative (list)
+	:param c: weight constraint (int)
+	:param S: number of items each item stands for, W and P hold their summed weights and values (list)
+
+	:returns: chosen items in descending order, None if no solution with a positive value is possible
+	:rtype: list, None
+	'''
+	S = S[:n] if S is not None else None
+	shift, B = relative_weights("weight", W[:n], S)
+	return WeightTable(k, B, P[:n], c - k*shift, S).solve(k, c - k*shift)
+
+def choose_engine(k, W, P, c, S=None):
+	'''
+	choose the knapsack formulation with the smaller table, (U+1) x (k+1) entries over values or (c'+1) x (k+1) over relative weights
+
+	:param k: number of items in solution (int)
+	:param W: item weights (list)
+	:param P: item values (list)
+	:param c: weight constraint (int)
+	:param S: number of items each item stands for (list)
+
+	:returns: "profit" or "weight"
+	:rtype: str
+	'''
+	shift, B = relative_weights("weight", W, S)
+	if c - k*shift < approx(k, P, S):
+		return "weight"
+	return "profit"
+
+class KnapsackMemo:
+	'''
+	cache of knapsack tables keyed by their items, so that repeated knapsacks of neighbouring iterations are answered from the cached table
+	tables over values answer any weight constraint, tables over weights any constraint up to their capacity, both any number of items up to their k
+	on a miss, a cached table whose items start the new items is copied and only the remaining items are added
+
+	:param maxsize: number of tables kept, the least recently used table is dropped first (int)
+	'''
+	def __init__(self, maxsize=32):
+		self.maxsize = maxsize
+		self.tables = collections.OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.extensions = 0
+
+	def hit_rate(self):
+		'''
+		get the share of knapsacks answered by a cached table
+
+		:returns: hits divided by all lookups, 0 without lookups
+		:rtype: float
+		'''
+		lookups = self.hits + self.misses
+		return self.hits / lookups if lookups else 0.0
+
+	def prefix_table(self, engine, k, B, P, S, c):
+		'''
+		find a cached table whose items start the given items and that can answer the query
+
+		:returns: cached table, None if there is none
+		:rtype: ProfitTable, WeightTable or None
+		'''
+		for (table_engine, table_B, table_P, table_S), table in reversed(self.tables.items()):
+			n = len(table_P)
+			if table_engine == engine and n < len(P) and table.serves(k, c) and list(table_P) == P[:n] and list(table_B) == B[:n] and list(table_S) == S[:n]:
+				return table
+		return None
+
+	def solve(self, n, k, W, P, c, engine=None, stats=None, S=None):
+		'''
+		solves the exact k-items Knapsack Problem using cached tables
+
+		:param n: number of items (int)
+		:param k: number of items in solution (int)
+		:param W: item weights (list)
+		:param P: item values, not negative (list)
+		:param c: weight constraint (int)
+		:param engine: "profit" or "weight" to force a formulation, a cached table or choose_engine decides if omitted (str)
+		:param stats: counters for hits, misses, extensions and formulations (dict)
+		:param S: number of items each item stands for, 1 for all if omitted (list)
+
+		:returns: chosen items in descending order, None if no solution is possible
+		:rtype: list, None
+		'''
+		W = list(W[:n])
+		P = list(P[:n])
+		S = list(S[:n]) if S is not None else [1]*n
+
+		# any cached table that answers the query is used
+		for table_engine in (ENGINES if engine is None else (engine,)):
+			shift, B = relative_weights(table_engine, W, S)
+			key = (table_engine, tuple(B), tuple(P), tuple(S))
+			table = self.tables.get(key)
+			if table is not None and table.serves(k, c - k*shift):
+				self.tables.move_to_end(key)
+				self.hits += 1
+				count_stat(stats, "knapsack_memo_hits")
+				count_stat(stats, "knapsack_" + table_engine)
+				return table.solve(k, c - k*shift)
+
+		self.misses += 1
+		count_stat(stats, "knapsack_memo_misses")
+
+		if engine is None:
+			engine = choose_engine(k, W, P, c, S)
+		count_stat(stats, "knapsack_" + engine)
+
+		shift, B = relative_weights(engine, W, S)
+		key = (engine, tuple(B), tuple(P), tuple(S))
+		table = self.prefix_table(engine, k, B, P, S, c - k*shift)
+
+		if table is not None:
+			# only add the items behind the cached ones
+			table = table.copy()
+			table.extend(B[len(table.P):], P[len(table.P):], S[len(table.P):])
+			self.extensions += 1
+			count_stat(stats, "knapsack_memo_extensions")
+		else:
+			# a table of the same items that was too small for the query is replaced by one answering both
+			old = self.tables.get(key)
+			table_k = max(k, old.k) if old is not None else k
+			if engine == "weight":
+				capacity = max(c - k*shift, old.capacity) if old is not None else c - k*shift
+				table = WeightTable(table_k, B, P, capacity, S)
+			else:
+				table = ProfitTable(table_k, B, P, S)
+
+		self.tables[key] = table
+		self.tables.move_to_end(key)
+		if len(self.tables) > self.maxsize:
+			self.tables.popitem(last=False)
+
+		return table.solve(k, c - k*shift)
+
+def e_kkp(n, k, W, P, c, engine=None, stats=None, memo=None, S=None):
+	'''
+	solves the exact k-items Knapsack Problem with the formulation of the smaller table
+	both formulations choose the same items
+
+	:param n: number of items (int)
+	:param k: number of items in solution (int)
+	:param W: item weights (list)
+	:param P: item values (list)
+	:param c: weight constraint (int)
+	:param engine: "profit" or "weight" to force a formulation, chosen by choose_engine if omitted (str)
+	:param stats: counts the calls per formulation under "knapsack_profit" and "knapsack_weight" (dict)
+	:param memo: cache of tables to answer repeated knapsacks from (KnapsackMemo)
+	:param S: number of items each item stands for, W and P hold their summed weights and values, see group_items (list)
+
+	:returns: chosen items in descending order, None if no solution is possible
+	:rtype: list, None
+	'''
+	if engine is not None and engine not in ENGINES:
+		raise ValueError("unknown knapsack engine %s" % engine)
+
+	if memo is not None:
+		return memo.solve(n, k, W, P, c, engine, stats, S)
+
+	if engine is None:
+		engine = choose_engine(k, W[:n], P[:n], c, S[:n] if S is not None else None)
+
+	count_stat(stats, "knapsack_" + engine)
+
+	if engine == "weight":
+		return e_kkp_weight(n, k, W, P, c, S)
+	return e_kkp_profit(n, k, W, P, c, S)
+
+def undominated_items(k, W, P):
+	'''
+	find the items e_kkp can choose, an item is left out if k other items are at least as valuable and at most as heavy, and more valuable, lighter or earlier
+	k items always leave one of them out, exchanging the item for it would give a more valuable, lighter or earlier solution
+
+	:param k: number of items in solution (int)
+	:param W: item weights (list)
+	:param P: item values (list)
+
+	:returns: indices of the remaining items in ascending order
+	:rtype: list
+	'''
+	W = np.asarray(W, dtype=np.int64)
+	P = np.asarray(P, dtype=np.int64)
+	items = np.arange(len(P))
+
+	# better[j, i] if item i can replace item j
+	better = (W[None, :] <= W[:, None]) & (P[None, :] >= P[:, None]) & ((W[None, :] < W[:, None]) | (P[None, :] > P[:, None]) | (items[None, :] < items[:, None]))
+	return [int(j) for j in np.flatnonzero(better.sum(axis=1) < k)]
+
+def group_items(W, P, items=None):
+	'''
+	collect runs of items of the same weight and value that follow each other, they are interchangeable and e_kkp chooses the first items of a run
+	items of the same weight and value with other items between them are kept apart, which of them e_kkp chooses depends on the items between them
+
+	:param W: item weights (list)
+	:param P: item values (list)
+	:param items: item indices in ascending order, all items if omitted (list)
+
+	:returns: item indices of every run in ascending order, runs ordered by their first item
+	:rtype: list of lists
+	'''
+	if items is None:
+		items = range(len(P))
+
+	groups = []
+	for j in items:
+		if groups and (W[groups[-1][-1]], P[groups[-1][-1]]) == (W[j], P[j]):
+			groups[-1].append(j)
+		else:
+			groups.append([j])
+	return groups
+
+def split_groups(groups):
+	'''
+	split groups into parts of 1, 2, 4, ... items and the rest, any number of items of a group is the size of some of its parts
+
+	:param groups: item indices of every group (list of lists)
+
+	:returns: group index and size of every part
+	:rtype: list of tuples
+	'''
+	parts = []
+	for g, group in enumerate(groups):
+		size = 1
+		remaining = len(group)
+		while remaining > 0:
+			parts.append((g, min(size, remaining)))
+			remaining -= size
+			size *= 2
+	return parts
+
+def e_kkp_grouped(n, k, W, P, c, engine=None, stats=None, memo=None):
+	'''
+	solves the exact k-items Knapsack Problem with the result of e_kkp on fewer items
+	items that can't be chosen are left out, see undominated_items, and the remaining items are grouped into runs of interchangeable items, see group_items
+	the tables have one item per part of a group, see split_groups, instead of one per item, of every group the first items are chosen
+
+	:param n: number of items (int)
+	:param k: number of items in solution (int)
+	:param W: item weights (list)
+	:param P: item values, not negative (list)
+	:param c: weight constraint (int)
+	:param engine: "profit" or "weight" to force a formulation (str)
+	:param stats: counts the items saved by leaving out and grouping items under "knapsack_items_grouped" and the knapsacks like e_kkp (dict)
+	:param memo: cache of tables to answer repeated knapsacks from (KnapsackMemo)
+
+	:returns: chosen items in descending order, None if no solution is possible
+	:rtype: list, None
+	'''
+	groups = group_items(W, P, undominated_items(k, W[:n], P[:n]))
+	parts = split_groups(groups)
+
+	if len(parts) >= n:
+		# nothing to gain
+		return e_kkp(n, k, W, P, c, engine, stats, memo)
+	count_stat(stats, "knapsack_items_grouped", n - len(parts))
+
+	W_parts = [s*W[groups[g][0]] for g, s in parts]
+	P_parts = [s*P[groups[g][0]] for g, s in parts]
+	S_parts = [s for g, s in parts]
+	chosen = e_kkp(len(parts), k, W_parts, P_parts, c, engine, stats, memo, S_parts)
+
+	if chosen is None:
+		return None
+
+	# expand the parts to the first items of their groups
+	counts = [0]*len(groups)
+	for j in chosen:
+		counts[parts[j][0]] += parts[j][1]
+	return sorted([j for group, count in zip(groups, counts) for j in group[:count]], reverse=True)
+
+def e_kkp_greedy(n, k, W, P, c):
+	'''
+	finds a solution of the exact k-items Knapsack Problem greedily, the most valuable items are taken as long as the lightest remaining items can complete them to k items
+	the first item taken is the most valuable one of any solution, so the solution is worth at least 1/k of the optimum
+
+	:param n: number of items (int)
+	:param k: number of items in solution (int)
+	:param W: item weights (list)
+	:param P: item values, not negative (list)
+	:param c: weight constraint (int)
+
+	:returns: chosen items, None if no solution is possible
+	:rtype: list, None
+	'''
+	lightest = sorted(range(n), key=lambda j: W[j])
+	if k > n or sum([W[j] for j in lightest[:k]]) > c:
+		return None
+
+	chosen = []
+	taken = set()
+	weight = 0
+	for j in sorted(range(n), key=lambda j: -P[j]):
+		if len(chosen) == k:
+			break
+
+		# the other places are filled with the lightest items left
+		fill = [i for i in lightest if i not in taken and i != j][:k-len(chosen)-1]
+		if weight + W[j] + sum([W[i] for i in fill]) <= c:
+			chosen.append(j)
+			taken.add(j)
+			weight += W[j]
+
+	return chosen
+
+def e_kkp_approx(n, k, W, P, c, epsilon, engine=None, stats=None, memo=None, grouped=False):
+	'''
+	approximates the exact k-items Knapsack Problem by solving it for values scaled down by K = epsilon*L/k, L is the value of e_kkp_greedy
+	the chosen items lose less than K per item, so they are worth at least OPT - epsilon*L >= (1-epsilon) OPT
+	no item of a solution is worth more than L, so scaled values are at most k/epsilon and the tables only depend on k and epsilon, once K would be at most 1 the problem is solved exactly
+
+	:param n: number of items (int)
+	:param k: number of items in solution (int)
+	:param W: item weights (list)
+	:param P: item values, not negative (list)
+	:param c: weight constraint (int)
+	:param epsilon: allowed relative loss of value, between 0 and 1 (float)
+	:param engine: "profit" or "weight" to force a formulation (str)
+	:param stats: counters of the knapsacks solved for the scaled values (dict)
+	:param memo: cache of tables to answer repeated knapsacks from (KnapsackMemo)
+	:param grouped: solve the knapsacks with e_kkp_grouped, scaling values down makes more items interchangeable (bool)
+
+	:returns:
+		* **chosen** – chosen items in descending order, None if no solution is possible (list)
+		* **bound** – upper bound for the value of the best solution (int)
+	:rtype: tuple (chosen, bound)
+	'''
+	if not 0 < epsilon < 1:
+		raise ValueError("epsilon has to be between 0 and 1, got %s" % epsilon)
+
+	P = P[:n]
+	solve = e_kkp_grouped if grouped else e_kkp
+
+	# lower bound of OPT, no solution if the greedy finds none
+	greedy = e_kkp_greedy(n, k, W, P, c)
+	if greedy is None:
+		return None, 0
+	L = sum([P[j] for j in greedy])
+	K = epsilon*L/k if k > 0 else 0
+
+	# the greedy first takes the most valuable item of any solution, more valuable items fit into no solution and are capped to keep the table small
+	top = P[greedy[0]] if greedy else 0
+	capped = [min(p, top) for p in P]
+
+	if K <= 1:
+		# scaling wouldn't shrink the table
+		chosen = solve(n, k, W, capped, c, engine, stats, memo)
+		return chosen, sum([P[j] for j in chosen]) if chosen is not None else 0
+
+	# top is worth more than K, so some solution keeps a positive scaled value
+	chosen = solve(n, k, W, [int(p // K) for p in capped], c, engine, stats, memo)
+	value = sum([P[j] for j in chosen])
+
+	# OPT is at most value + epsilon*L and integral
+	return chosen, math.floor(value + epsilon*L)
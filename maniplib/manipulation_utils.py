@@ -1,30 +1,122 @@
+import bisect
+import heapq
+import itertools
 import math
+from collections import Counter
+from maniplib.profile import Profile, PositionHistogram, Utilities, as_profile
+
+def count_stat(stats, key, amount=1):
+	'''
+	add to a counter of an optional statistics dict
+
+	:param stats: counters by name, nothing is counted if None (dict)
+	:param key: name of the counter (str)
+	:param amount: amount to add (int)
+	'''
+	if stats is not None:
+		stats[key] = stats.get(key, 0) + amount
 
 def get_score_map(l, rankmaps):
 	'''
 	calculates scores for all candidates according to l-bloc rule and votes casted in rankmaps
 
 	:param l: paramenter of l-bloc-rule (int)
-	:param rankmaps: preflib data structure for voters preferences (list of dicts)
+	:param rankmaps: preflib data structure for voters preferences (list of dicts, Profile or PositionHistogram)
+
+	:returns: candidates and their scores
+	:rtype: dict
+	'''
+	if isinstance(rankmaps, PositionHistogram):
+		return rankmaps.score_map(l)
+
+	# the histogram of a profile is built once, scoring it again for any l is a lookup of its prefix sums
+	return as_profile(rankmaps).histogram().score_map(l)
+
+def get_score_map_from_rankcounts(l, rankcounts):
+	'''
+	calculates scores for all candidates according to l-bloc rule from aggregated votes
+
+	:param l: paramenter of l-bloc-rule (int)
+	:param rankcounts: number of voters ranking a candidate at a rank {candidate:{rank:count}} (dict)
 
 	:returns: candidates and their scores
 	:rtype: dict
 	'''
-	# init scoremap
 	scoremap = {}
-	for voter in rankmaps:
-		for can in voter:
-			scoremap[can] = 0
 
-	# sum up every candidate's score
-	for voter in rankmaps:
-		for can in voter:
-			# check if candidate is in voters l highest preferences
-			if voter[can] <= l:
-				scoremap[can] += 1
+	# sum up the voters ranking a candidate in their l highest preferences
+	for can, ranks in rankcounts.items():
+		scoremap[can] = sum([count for rank, count in ranks.items() if rank <= l])
 
 	return scoremap
 
+class StrengthOrder(list):
+	'''
+	candidate indices ordered by strength, strongest candidates in the front
+	behaves like the list of candidate indices, positions are kept in an inverse array indexed by candidate so that index and membership tests take constant time
+	the order must not be modified after construction
+
+	:param order: candidate indices, strongest candidates in the front (list)
+	'''
+	def __init__(self, order):
+		super().__init__(order)
+
+		# positions[can] is the position of candidate can, None if the candidate is not ordered
+		self.positions = [None]*(max(self, default=0)+1)
+		for pos, can in enumerate(self):
+			self.positions[can] = pos
+
+		# sets of the k strongest candidates, built on first use
+		self.tops = {}
+
+	def position(self, can):
+		'''
+		get the position of a candidate
+
+		:param can: candidate index (int)
+
+		:returns: position in the strength order, None if the candidate is not ordered
+		:rtype: int
+		'''
+		if 0 <= can < len(self.positions):
+			return self.positions[can]
+		return None
+
+	def index(self, can):
+		pos = self.position(can)
+		if pos is None:
+			raise ValueError("%s is not in strength order" % can)
+		return pos
+
+	def __contains__(self, can):
+		return self.position(can) is not None
+
+	def top(self, k):
+		'''
+		get the k strongest candidates as a set
+
+		:param k: number of candidates (int)
+
+		:returns: k strongest candidates
+		:rtype: frozenset
+		'''
+		if k not in self.tops:
+			self.tops[k] = frozenset(self[:k])
+		return self.tops[k]
+
+def as_strength_order(strength_order):
+	'''
+	convert an ordering of candidates into a StrengthOrder, StrengthOrders are returned as they are
+
+	:param strength_order: candidate indices, strongest candidates in the front (list or StrengthOrder)
+
+	:returns: strength order with constant time position lookups
+	:rtype: StrengthOrder
+	'''
+	if isinstance(strength_order, StrengthOrder):
+		return strength_order
+	return StrengthOrder(strength_order)
+
 def get_strength_order_lex(scoremap):
 	'''
 	sort candidates according to voters preferences and lex_tb
@@ -32,37 +124,136 @@ def get_strength_order_lex(scoremap):
 	:param scoremap: mapping from candidates to scores (dict)
 
 	:returns: candidate indices, strongest candidates in the front
-	:rtype: list
+	:rtype: StrengthOrder
 	'''
-	strength_order = []
-
-	# sort scores descending
-	scores = list(set(scoremap.values()))
-	scores.sort(reverse=True)
+	# sort scores descending, candidates with the same score by index for lexicographic tie-breaking
+	return StrengthOrder(sorted(scoremap, key=lambda can: (-scoremap[can], can)))
 
-	# check how many candidates with the same score exist
-	for score in scores:
-		same_score = list(filter(lambda xy : xy[1]==score, scoremap.items()))
-		if len(same_score)==1:
-			strength_order.append(same_score[0][0])
-		else:
-			# perform tie-breaking for more than one candidate with the same score
-			# sort by index for lexicographic tie-breaking
-			tb = sorted([x[0] for x in same_score])
-			strength_order.extend(tb)
+class ScoreIndex:
+	'''
+	candidates grouped by score, the scores are kept sorted so that range queries bisect instead of scanning all candidates
+	queries return candidates in strength order, higher scores first and candidates with the same score by index
 
-	return strength_order
+	:param scoremap: mapping from candidates to scores (dict)
+	'''
+	def __init__(self, scoremap):
+		self.scoremap = scoremap
+		self.buckets = {}
+		for can, score in scoremap.items():
+			self.buckets.setdefault(score, []).append(can)
+		for bucket in self.buckets.values():
+			bucket.sort()
+
+		# position of every candidate in the scoremap, to restore its order for results depending on it
+		self.positions = {can: i for i, can in enumerate(scoremap)}
+
+		# ascending scores and number of candidates with a lower score
+		self.scores = sorted(self.buckets)
+		self.lower = [0]
+		for score in self.scores:
+			self.lower.append(self.lower[-1]+len(self.buckets[score]))
+
+	def at(self, score):
+		'''
+		get candidates with exactly the given score
+
+		:param score: score (int)
+
+		:returns: candidate indices sorted ascending
+		:rtype: list
+		'''
+		return self.buckets.get(score, [])
+
+	def at_after(self, score, c):
+		'''
+		get candidates with exactly the given score and an index greater than c
+
+		:param score: score (int)
+		:param c: candidate index (int)
+
+		:returns: candidate indices sorted ascending
+		:rtype: list
+		'''
+		bucket = self.at(score)
+		return bucket[bisect.bisect_right(bucket, c):]
+
+	def at_before(self, score, c):
+		'''
+		get candidates with exactly the given score and an index smaller than c
+
+		:param score: score (int)
+		:param c: candidate index (int)
+
+		:returns: candidate indices sorted ascending
+		:rtype: list
+		'''
+		bucket = self.at(score)
+		return bucket[:bisect.bisect_left(bucket, c)]
+
+	def between(self, low, high):
+		'''
+		get candidates with a score strictly between low and high
+
+		:param low: exclusive lower bound (int)
+		:param high: exclusive upper bound (int)
+
+		:returns: candidate indices in strength order
+		:rtype: list
+		'''
+		first = bisect.bisect_right(self.scores, low)
+		last = bisect.bisect_left(self.scores, high)
+
+		cands = []
+		for i in range(last-1, first-1, -1):
+			cands.extend(self.buckets[self.scores[i]])
+		return cands
+
+	def above(self, score):
+		'''
+		get candidates with a score greater than the given score
+
+		:param score: exclusive lower bound (int)
+
+		:returns: candidate indices in strength order
+		:rtype: list
+		'''
+		return self.between(score, math.inf)
+
+	def count_above(self, score):
+		'''
+		count candidates with a score greater than the given score
+
+		:param score: exclusive lower bound (int)
+
+		:returns: number of candidates
+		:rtype: int
+		'''
+		return self.lower[-1] - self.lower[bisect.bisect_right(self.scores, score)]
+
+	def count_below(self, score):
+		'''
+		count candidates with a score lower than the given score
+
+		:param score: exclusive upper bound (int)
+
+		:returns: number of candidates
+		:rtype: int
+		'''
+		return self.lower[bisect.bisect_left(self.scores, score)]
 
 def utilitarian(S, utilities):
 	'''
 	evaluates elected kegroup for manipulators by utilitarian function
 
 	:param S: choice of candidates in kegroup (list)
-	:param utilities: manipulators utilities {manipulator_index:utility} (list)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
 
 	:returns: utilitarian value
 	:rtype: int
 	'''
+	if isinstance(utilities, Utilities):
+		return int(utilities.rows(S).sum())
+
 	result = 0
 
 	# sum up all manipulator's utility values for candidates in S
@@ -78,11 +269,14 @@ def candegal(S, utilities):
 	evaluates elected kegroup for manipulators by candidate-wise egalitarian function
 
 	:param S: choice of candidates in kegroup (list)
-	:param utilities: manipulators utilities {manipulator_index:utility} (list)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
 
 	:returns: utilitarian value
 	:rtype: int
 	'''
+	if isinstance(utilities, Utilities):
+		return int(utilities.rows(S).min(axis=1).sum())
+
 	result = 0
 
 	# scan utilities for manipulator that gains least utility from a candidate
@@ -102,12 +296,15 @@ def egalitarian(S, utilities, r):
 	evaluates elected kegroup for manipulators by egalitarian function
 
 	:param S: choice of candidates in kegroup (list)
-	:param utilities: manipulators utilities {manipulator_index:utility} (list)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
 	:param r: number of manipulators
 
 	:returns: utilitarian value
 	:rtype: int
 	'''
+	if isinstance(utilities, Utilities):
+		return int(utilities.rows(S).min())
+
 	ut = []
 	# compute manipulators utilities
 	for can in S:
@@ -118,22 +315,142 @@ def egalitarian(S, utilities, r):
 	# determine least satisfied manipulator
 	return min(ut)
 
+def is_separable(eval_f):
+	'''
+	check if an evaluation function sums up values of single candidates, so that the value of a set is the sum of get_value_map over its members
+
+	:param eval_f: evaluation function (function)
+
+	:returns: True for utilitarian and candegal
+	:rtype: bool
+	'''
+	return eval_f is utilitarian or eval_f is candegal
+
+def get_value_map(utilities, eval_f):
+	'''
+	evaluates every candidate on its own
+
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
+	:param eval_f: evaluation function (function)
+
+	:returns: mapping from candidate indices to their value
+	:rtype: dict
+	'''
+	candidates = range(1, len(utilities)+1)
+
+	# evaluate all rows at once for the evaluation functions that sum up single candidates
+	if isinstance(utilities, Utilities) and eval_f is utilitarian:
+		return dict(zip(candidates, utilities.values.sum(axis=1).tolist()))
+	if isinstance(utilities, Utilities) and eval_f is candegal:
+		return dict(zip(candidates, utilities.values.min(axis=1).tolist()))
+
+	return {i: eval_f([i], utilities) for i in candidates}
+
+class ManipulationContext:
+	'''
+	data of one manipulation problem that the helpers share, computed once instead of in every iteration
+	holds the scoremap, strength order and score index of the nonmanipulative votes and caches the value of every candidate per evaluation function
+
+	:param l: parameter of l-bloc rule (int)
+	:param non_manip_rankmaps: rankmaps of nonmanipulative votes (list of dicts, Profile or PositionHistogram)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
+	:param value_maps: value maps of the same utilities to share with other contexts, they don't depend on l (dict)
+	'''
+	def __init__(self, l, non_manip_rankmaps, utilities=None, value_maps=None):
+		self.l = l
+		self.utilities = utilities
+		self.scoremap = get_score_map(l, non_manip_rankmaps)
+		self.strength_order = get_strength_order_lex(self.scoremap)
+		self.score_index = ScoreIndex(self.scoremap)
+
+		# value maps and value rankings per evaluation function, built on first use
+		self.value_maps = value_maps if value_maps is not None else {}
+		self.value_rankings = {}
+
+		# distinguished candidates per dropped candidate and number of manipulators
+		self.distinguished = {}
+
+	def values(self, eval_f):
+		'''
+		get the value of every single candidate according to the evaluation function
+
+		:param eval_f: evaluation function (function)
+
+		:returns: mapping from candidate indices to their value
+		:rtype: dict
+		'''
+		if eval_f not in self.value_maps:
+			self.value_maps[eval_f] = get_value_map(self.utilities, eval_f)
+		return self.value_maps[eval_f]
+
+	def value_ranks(self, eval_f):
+		'''
+		rank the candidates of the strength order by their value once per evaluation function, higher values first and equal values by strength order
+		candidates no nonmanipulative voter ranks are not in the strength order and get no rank
+
+		:param eval_f: evaluation function (function)
+
+		:returns: ranks indexed by candidate index, candidates with lower ranks are more valuable
+		:rtype: list
+		'''
+		if eval_f not in self.value_rankings:
+			values = self.values(eval_f)
+			order = sorted(range(len(self.strength_order)), key=lambda pos: (-values[self.strength_order[pos]], pos))
+
+			ranks = [None]*(max(self.strength_order, default=0)+1)
+			for rank, pos in enumerate(order):
+				ranks[self.strength_order[pos]] = rank
+			self.value_rankings[eval_f] = ranks
+		return self.value_rankings[eval_f]
+
+	def position(self, can):
+		'''
+		get the position of a candidate in the nonmanipulative strength order
+
+		:param can: candidate index (int)
+
+		:returns: position in the strength order, None if the candidate is not ordered
+		:rtype: int
+		'''
+		return self.strength_order.position(can)
+
+	def boosted_top(self, X, r, k):
+		'''
+		get the k strongest candidates after r manipulators approve every candidate in X
+		only the candidates of X change their score, so they are sorted on their own and merged into the strength order of the others
+
+		:param X: supported candidates, a candidate listed twice is approved twice (list)
+		:param r: number of manipulators (int)
+		:param k: number of candidates (int)
+
+		:returns: k strongest candidates, strongest candidates in the front
+		:rtype: list
+		'''
+		boost = Counter(X)
+		key = lambda can: (-(self.scoremap[can]+r*boost[can]), can)
+
+		supported = sorted(boost, key=key)
+		others = (can for can in self.strength_order if can not in boost)
+
+		return list(itertools.islice(heapq.merge(supported, others, key=key), k))
+
 def check_manipul(k, max_S, strength_order):
 	'''
 	counts how many candidates get exchanged after manipulation
 
 	:param k: winning egroup size (int)
 	:param max_S: winning kegroup that maximizes manipulator's satisfaction
-	:param strength_order: ordering of the candidates according to nonmanipulative votes (list)
+	:param strength_order: ordering of the candidates according to nonmanipulative votes (list or StrengthOrder)
 
 	:returns: number of candidates exchanged
 	:rtype: int
 	'''
 	exchanged = 0
+	winners = as_strength_order(strength_order).top(k)
 
 	# find differences between manipulative winners and nonmanipulative winners
 	for can in max_S:
-		if can not in strength_order[:k]:
+		if can not in winners:
 			exchanged += 1
 
 	return exchanged
@@ -142,7 +459,7 @@ def get_types(utilities):
 	'''
 	get type data structures needed for tie breaking algorithm
 
-	:param utilities: manipulators utilities {manipulator_index:utility} (list)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
 
 	:returns: 
 		* **T** – types, tuples of utility values (list)
@@ -151,10 +468,73 @@ def get_types(utilities):
 	:rtype: tuple (T, T_count, candidates)
 	'''
 	# determine possible type vectors by removing duplicates
-	candidates = [tuple(d.values()) for d in utilities]
+	if isinstance(utilities, Utilities):
+		candidates = [tuple(row) for row in utilities.values.tolist()]
+	else:
+		candidates = [tuple(d.values()) for d in utilities]
 	T = list(set(candidates))
 
 	# T_count[i] denotes the count of candidates of type T[i] in utilities
-	T_count = [candidates.count(type) for type in T]
+	counts = Counter(candidates)
+	T_count = [counts[type] for type in T]
 
-	return T, T_count, candidates
\ No newline at end of file
+	return T, T_count, candidates
+
+class GroupIndex:
+	'''
+	candidates grouped by type and score, built once per scoremap so that a group G_ij of the egalitarian ILP is a lookup
+	G_ij for z are the candidates of type T[i] that need j approvals to reach z, i.e. have the score z-j
+
+	:param T: types, tuples of utility values, see get_types (list)
+	:param candidates: list of each candidate's type, candidate indices start at 1 (list)
+	:param scoremap: mapping from candidates to scores (dict)
+	'''
+	def __init__(self, T, candidates, scoremap):
+		type_ids = {t: i for i, t in enumerate(T)}
+
+		# candidates are visited in ascending order, so every group is sorted
+		self.groups = {}
+		for can, t in enumerate(candidates, 1):
+			self.groups.setdefault((type_ids[t], scoremap[can]), []).append(can)
+
+		# non-empty groups by score
+		self.by_score = {}
+		for (i, score), G in sorted(self.groups.items()):
+			self.by_score.setdefault(score, []).append((i, G))
+
+	def group(self, i, j, z):
+		'''
+		get the members of G_ij for z
+
+		:param i: type index in T (int)
+		:param j: number of approvals needed to reach z (int)
+		:param z: lowest possible score of a winning candidate (int)
+
+		:returns: candidate indices sorted ascending
+		:rtype: list
+		'''
+		return self.groups.get((i, z-j), [])
+
+	def nonempty(self, z, r):
+		'''
+		get the groups G_ij for z and j from 0 to r that have members
+
+		:param z: lowest possible score of a winning candidate (int)
+		:param r: largest number of approvals (int)
+
+		:returns: type index, j and members of every non-empty group, ordered by j and type
+		:rtype: list of tuples
+		'''
+		return [(i, j, G) for j in range(r+1) for i, G in self.by_score.get(z-j, [])]
+
+	def sizes(self, z, r):
+		'''
+		get the number of candidates of all types that need j approvals to reach z, for j from 0 to r
+
+		:param z: lowest possible score of a winning candidate (int)
+		:param r: largest number of approvals (int)
+
+		:returns: number of candidates by j
+		:rtype: list
+		'''
+		return [sum([len(G) for i, G in self.by_score.get(z-j, [])]) for j in range(r+1)]
@@ -61,64 +61,164 @@ def write_map(candmap, nvoters, votemap, file):
 	for vote, count in sorted(votemap.items(), key=lambda x: x[1], reverse=True):
 		file.write(str(count) + "," + vote + "\n")
 		
-# Given a file in one of the Preflib Election Data 
-# formats, return a list of rankmaps.
-def read_election_file(inputfile):
+# Given a file in one of the Preflib Election Data formats, read
+# the header and return the candmap, the number of voters, the sum
+# of the vote counts and the number of unique orders.
+def read_election_header(inputfile):
 	#first element is the number of candidates.
 	l = inputfile.readline()
 	numcands = int(l.strip())
 	candmap = {}
 	for i in range(numcands):
 		bits = inputfile.readline().strip().split(",")
+		if len(bits) < 2:
+			raise ValueError("Error Parsing File: Malformed Candidate!")
 		candmap[int(bits[0].strip())] = bits[1].strip()
 	
 	#now we have numvoters, sumofvotecount, numunique orders
 	bits = inputfile.readline().strip().split(",")
+	if len(bits) < 3:
+		raise ValueError("Error Parsing File: Malformed Header!")
 	numvoters = int(bits[0].strip())
 	sumvotes = int(bits[1].strip())
 	uniqueorders = int(bits[2].strip())
 	
-	rankmaps = []
-	rankmapcounts = []
+	return candmap, numvoters, sumvotes, uniqueorders
+
+# Parse a single record of a Preflib Election Data file
+# into its count and rankmap.  If depth is given, only the
+# candidates ranked within the first depth ranks are kept.
+def parse_election_record(rec, depth=None):
+	if depth is not None:
+		return parse_truncated_record(rec, depth)
+	#need to parse the rec properly..
+	if rec.find("{") == -1:
+		#its strict, just split on ,
+		count = int(rec[:rec.index(",")])
+		bits = rec[rec.index(",")+1:].strip().split(",")
+		cvote = {}
+		for crank in range(len(bits)): 
+			cvote[int(bits[crank])] = crank+1
+	else:
+		count = int(rec[:rec.index(",")])
+		bits = rec[rec.index(",")+1:].strip().split(",")
+		cvote = {}
+		crank = 1
+		partial = False
+		for ccand in bits:
+			if ccand.find("{") != -1:
+				partial = True
+				t = ccand.replace("{","")
+				cvote[int(t.strip())] = crank
+			elif ccand.find("}") != -1:
+				partial = False
+				t = ccand.replace("}","")
+				cvote[int(t.strip())] = crank
+				crank += 1
+			else:
+				cvote[int(ccand.strip())] = crank
+				if partial == False:
+					crank += 1
+		#the record ended within a tied group
+		if partial:
+			raise ValueError("Error Parsing File: Unclosed Tie!")
+	return count, cvote
+
+# Parse the first depth ranks of a single record into its count
+# and rankmap.  The record is scanned from the left and scanning
+# stops as soon as the rank exceeds depth, so the rest of the line
+# is never split.  A tied group {...} shares one rank, so a group
+# starting within the first depth ranks is always kept completely.
+def parse_truncated_record(rec, depth):
+	sep = rec.index(",")
+	count = int(rec[:sep])
+	cvote = {}
+	crank = 1
+	partial = False
+	pos = sep+1
+	end = len(rec)
+	while pos < end and crank <= depth:
+		nxt = rec.find(",", pos)
+		if nxt == -1:
+			nxt = end
+		ccand = rec[pos:nxt]
+		pos = nxt+1
+		if ccand.find("{") != -1:
+			partial = True
+			ccand = ccand.replace("{","")
+		if ccand.find("}") != -1:
+			partial = False
+			cvote[int(ccand.replace("}","").strip())] = crank
+			crank += 1
+		else:
+			cvote[int(ccand.strip())] = crank
+			if partial == False:
+				crank += 1
+	#the record ended within a tied group
+	if partial:
+		raise ValueError("Error Parsing File: Unclosed Tie!")
+	return count, cvote
+
+# Given a file in one of the Preflib Election Data formats that
+# is positioned behind the header, lazily yield (count, rankmap)
+# records straight from the file handle.  Only one record is held
+# in memory at a time.  If depth is given, every rankmap is cut
+# off after the first depth ranks.  If numcands is given as well,
+# records are parsed completely until all numcands candidates have
+# appeared, so the order of their first appearance is kept.
+def iter_election_records(inputfile, uniqueorders, depth=None, numcands=None):
+	seen = set()
 	for i in range(uniqueorders):
 		rec = inputfile.readline().strip()
-		#need to parse the rec properly..
-		if rec.find("{") == -1:
-			#its strict, just split on ,
-			count = int(rec[:rec.index(",")])
-			bits = rec[rec.index(",")+1:].strip().split(",")
-			cvote = {}
-			for crank in range(len(bits)): 
-				cvote[int(bits[crank])] = crank+1
-			rankmaps.append(cvote)
-			rankmapcounts.append(count)
+		#the file ended before all orders were read
+		if rec == "":
+			raise ValueError("Error Parsing File: Votes Not Accounted For!")
+		if depth is not None and numcands is not None and len(seen) < numcands:
+			count, cvote = parse_election_record(rec)
+			seen.update(cvote)
+			yield count, cvote
 		else:
-			count = int(rec[:rec.index(",")])
-			bits = rec[rec.index(",")+1:].strip().split(",")
-			cvote = {}
-			crank = 1
-			partial = False
-			for ccand in bits:
-				if ccand.find("{") != -1:
-					partial = True
-					t = ccand.replace("{","")
-					cvote[int(t.strip())] = crank
-				elif ccand.find("}") != -1:
-					partial = False
-					t = ccand.replace("}","")
-					cvote[int(t.strip())] = crank
-					crank += 1
-				else:
-				 	cvote[int(ccand.strip())] = crank
-				 	if partial == False:
-				 		crank += 1
-			rankmaps.append(cvote)
-			rankmapcounts.append(count)
+			yield parse_election_record(rec, depth)
+
+# Given a file in one of the Preflib Election Data formats, fold
+# the records into a candidate --> (rank --> count) map without
+# keeping the rankmaps.  Memory only depends on the number of
+# candidates and ranks, not on the number of voters or orders.
+# If depth is given, only the first depth ranks are counted.
+def aggregate_election_file(inputfile, depth=None):
+	candmap, numvoters, sumvotes, uniqueorders = read_election_header(inputfile)
+
+	rankcounts = {}
+	countedvotes = 0
+	countedorders = 0
+	for count, cvote in iter_election_records(inputfile, uniqueorders, depth):
+		for ccand, crank in cvote.items():
+			cranks = rankcounts.setdefault(ccand, {})
+			cranks[crank] = cranks.get(crank, 0) + count
+		countedvotes += count
+		countedorders += 1
+
+	#Sanity check:
+	if countedvotes != sumvotes or countedorders != uniqueorders:
+		raise ValueError("Error Parsing File: Votes Not Accounted For!")
+
+	return candmap, rankcounts, numvoters
+
+# Given a file in one of the Preflib Election Data 
+# formats, return a list of rankmaps.  If depth is given,
+# only the first depth ranks of every vote are kept.
+def read_election_file(inputfile, depth=None):
+	candmap, numvoters, sumvotes, uniqueorders = read_election_header(inputfile)
+	
+	rankmaps = []
+	rankmapcounts = []
+	for count, cvote in iter_election_records(inputfile, uniqueorders, depth):
+		rankmaps.append(cvote)
+		rankmapcounts.append(count)
 		
 	#Sanity check:
 	if sum(rankmapcounts) != sumvotes or len(rankmaps) != uniqueorders:
-		print("Error Parsing File: Votes Not Accounted For!")
-		exit()
+		raise ValueError("Error Parsing File: Votes Not Accounted For!")
 	
 	return candmap, rankmaps, rankmapcounts, numvoters
 
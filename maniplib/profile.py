@@ -0,0 +1,472 @@
+import json
+import os
+import tempfile
+import numpy as np
+
+def replace_file(path, write, mode="wb"):
+	'''
+	write a file atomically, readers either see the old or the new file but never a partially written one
+
+	:param path: path of the file (str)
+	:param write: function writing the content to a file object (function)
+	:param mode: mode to open the temporary file with (str)
+	'''
+	fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp-")
+	try:
+		with os.fdopen(fd, mode) as f:
+			write(f)
+		os.replace(tmp, path)
+	except BaseException:
+		os.remove(tmp)
+		raise
+
+def rank_dtype(numranks):
+	'''
+	choose the smallest integer type that can hold numranks ranks and the unranked sentinel
+
+	:param numranks: highest possible rank (int)
+
+	:returns: int16 or int32
+	:rtype: numpy.dtype
+	'''
+	if numranks < np.iinfo(np.int16).max:
+		return np.dtype(np.int16)
+	return np.dtype(np.int32)
+
+class Profile:
+	'''
+	count-weighted voters preferences, every unique vote is stored once together with the number of voters casting it
+	votes are rows of a dense rank matrix (unique votes x candidates), candidates a vote does not rank hold the sentinel unranked
+	iterating over a profile yields (rankmap, count) pairs, voters are indexed from 0 to numvoters-1 in the order of the rows
+
+	:param ranks: rank of every candidate per unique vote (numpy.ndarray)
+	:param counts: number of voters per unique vote (numpy.ndarray)
+	:param candidates: candidate index of every column (list)
+	:param depth: number of ranks kept per vote if the votes are truncated, None for complete votes (int)
+	:param keep_candidates: score every column even if no vote ranks the candidate (bool)
+	'''
+	def __init__(self, ranks, counts, candidates, depth=None, keep_candidates=False):
+		self.ranks = ranks
+		self.counts = counts
+		self.candidates = list(candidates)
+		self.depth = depth
+		self.keep_candidates = keep_candidates
+		self.unranked = np.iinfo(ranks.dtype).max
+
+		# first voter index of every unique vote, needed to map voter indices to votes
+		self.offsets = np.cumsum(counts) - counts
+		self.numvoters = int(np.sum(counts))
+
+		# position histogram, built on first use
+		self.cached_histogram = None
+
+	@classmethod
+	def from_records(cls, records, numorders, numcandidates, candidates=None, depth=None):
+		'''
+		build a profile from (count, rankmap) records without keeping the rankmaps
+
+		:param records: number of voters and candidate to rank mapping per unique vote (iterable of tuples)
+		:param numorders: number of records (int)
+		:param numcandidates: number of candidates, used to size the rank matrix (int)
+		:param candidates: candidates that are scored even if no vote ranks them, in column order (list)
+		:param depth: number of ranks kept per vote if the votes are truncated (int)
+
+		:returns: count-weighted profile
+		:rtype: Profile
+		'''
+		# columns are assigned in order of first appearance unless the candidates are given
+		columns = {}
+		if candidates is not None:
+			for can in candidates:
+				columns[can] = len(columns)
+
+		dtype = rank_dtype(numcandidates)
+		ranks = np.full((numorders, max(numcandidates, len(columns))), np.iinfo(dtype).max, dtype=dtype)
+		counts = np.zeros(numorders, dtype=np.int64)
+
+		for i, (count, rankmap) in enumerate(records):
+			counts[i] = count
+			for can, rank in rankmap.items():
+				col = columns.get(can)
+				if col is None:
+					col = len(columns)
+					columns[can] = col
+					# grow the matrix if a vote ranks more candidates than expected
+					if col >= ranks.shape[1]:
+						grown = np.full((numorders, 2*col+1), np.iinfo(dtype).max, dtype=dtype)
+						grown[:, :ranks.shape[1]] = ranks
+						ranks = grown
+				ranks[i, col] = rank
+
+		return cls(ranks[:, :len(columns)], counts, columns.keys(), depth, candidates is not None)
+
+	@classmethod
+	def from_rankmaps(cls, rankmaps, counts=None, candidates=None, depth=None):
+		'''
+		build a profile from rankmaps
+
+		:param rankmaps: candidate to rank mapping per unique vote (list of dicts)
+		:param counts: number of voters per rankmap, every rankmap is counted once if omitted (list)
+		:param candidates: candidates that are scored even if no rankmap contains them (list)
+		:param depth: number of ranks kept per vote if the votes are truncated (int)
+
+		:returns: count-weighted profile
+		:rtype: Profile
+		'''
+		if counts is None:
+			counts = [1 for rankmap in rankmaps]
+
+		numcandidates = len(set().union(*rankmaps, candidates or []))
+		return cls.from_records(zip(counts, rankmaps), len(rankmaps), numcandidates, candidates, depth)
+
+	def save(self, directory):
+		'''
+		write the profile into a directory as uncompressed arrays that can be memory-mapped by load
+
+		:param directory: path of the directory, created if missing (str)
+		'''
+		os.makedirs(directory, exist_ok=True)
+		replace_file(os.path.join(directory, "ranks.npy"), lambda f: np.save(f, self.ranks))
+		replace_file(os.path.join(directory, "counts.npy"), lambda f: np.save(f, self.counts))
+
+		info = {"candidates": self.candidates, "depth": self.depth, "keep_candidates": self.keep_candidates}
+		replace_file(os.path.join(directory, "profile.json"), lambda f: json.dump(info, f), "w")
+
+	@classmethod
+	def load(cls, directory, mmap_mode="r"):
+		'''
+		read a profile written by save, by default the arrays are memory-mapped read-only instead of read
+		processes loading the same profile share the pages of the rank matrix
+
+		:param directory: path of the directory (str)
+		:param mmap_mode: mode passed to numpy.load, None reads the arrays into memory (str)
+
+		:returns: count-weighted profile
+		:rtype: Profile
+		'''
+		ranks = np.load(os.path.join(directory, "ranks.npy"), mmap_mode=mmap_mode)
+		counts = np.load(os.path.join(directory, "counts.npy"), mmap_mode=mmap_mode)
+		with open(os.path.join(directory, "profile.json"), "r") as f:
+			info = json.load(f)
+
+		return cls(ranks, counts, info["candidates"], info["depth"], info["keep_candidates"])
+
+	def rankmap(self, row):
+		'''
+		convert a row of the rank matrix to a rankmap
+
+		:param row: index of the unique vote (int)
+
+		:returns: candidate to rank mapping ordered by rank
+		:rtype: dict
+		'''
+		ranks = self.ranks[row]
+		ranked = np.flatnonzero(ranks != self.unranked)
+		ranked = ranked[np.argsort(ranks[ranked], kind="stable")]
+		return {self.candidates[col]: int(ranks[col]) for col in ranked}
+
+	def to_rankmaps(self):
+		'''
+		convert the profile to the preflib data structures
+
+		:returns:
+			* **rankmaps** – candidate to rank mapping per unique vote (list of dicts)
+			* **rankmapcounts** – number of voters per rankmap (list)
+		:rtype: tuple (rankmaps, rankmapcounts)
+		'''
+		return [self.rankmap(row) for row in range(len(self))], self.counts.tolist()
+
+	def __iter__(self):
+		for row in range(len(self)):
+			yield self.rankmap(row), int(self.counts[row])
+
+	def __len__(self):
+		return len(self.counts)
+
+	def position(self, i):
+		'''
+		find the unique vote voter i has cast
+
+		:param i: voter index (int)
+
+		:returns: row of the voter's vote
+		:rtype: int
+		'''
+		if i < 0 or i >= self.numvoters:
+			raise IndexError("voter index out of range")
+		return int(np.searchsorted(self.offsets, i, side="right"))-1
+
+	def voter(self, i):
+		'''
+		get the rankmap of a single voter
+
+		:param i: voter index (int)
+
+		:returns: candidate to rank mapping of voter i
+		:rtype: dict
+		'''
+		return self.rankmap(self.position(i))
+
+	def max_rank(self):
+		'''
+		determine the highest rank any voter gives to a candidate
+
+		:returns: highest rank
+		:rtype: int
+		'''
+		ranked = self.ranks[self.ranks != self.unranked]
+		return int(ranked.max())
+
+	def histogram(self):
+		'''
+		get the position histogram of the profile, it is built once and reused afterwards
+
+		:returns: number of voters ranking each candidate at each position
+		:rtype: PositionHistogram
+		'''
+		if self.cached_histogram is None:
+			self.cached_histogram = PositionHistogram.from_profile(self)
+		return self.cached_histogram
+
+	def without_voters(self, voters):
+		'''
+		remove single voters from the profile, votes that are not cast anymore are dropped
+		truncated votes raise a ValueError if the candidates left depend on ranks below the depth
+
+		:param voters: voter indices (iterable)
+
+		:returns: profile without the given voters
+		:rtype: Profile
+		'''
+		rows = [self.position(i) for i in set(voters)]
+		counts = self.counts - np.bincount(rows, minlength=len(self)).astype(self.counts.dtype)
+		keep = counts > 0
+		ranks = self.ranks[keep]
+
+		# truncated votes are complete up to the vote ranking the last candidate for the first time, see dataset_from_file,
+		# every candidate has to be ranked by one of them that is left, otherwise the order and the candidates depend on unknown ranks
+		if self.depth is not None and not self.keep_candidates and keep.any():
+			ranked = self.ranks != self.unranked
+			covered = np.logical_or.accumulate(ranked, axis=0).all(axis=1)
+			complete = int(covered.argmax())+1 if covered.any() else len(self)
+			if not ranked[:complete][keep[:complete]].any(axis=0).all():
+				raise ValueError("votes are truncated after rank %d, cannot remove the voters of the complete votes" % self.depth)
+
+		# candidates only ranked by the removed voters are not part of the election anymore
+		if self.keep_candidates:
+			columns = np.arange(len(self.candidates))
+		elif not keep.any():
+			# no vote is cast anymore, so no candidate is ranked
+			columns = np.arange(0)
+		else:
+			# the remaining columns are ordered by first appearance among the remaining votes like a profile built from them,
+			# the scoremap, and with it the order ties are broken in, follows the column order
+			ranked = ranks != self.unranked
+			columns = np.flatnonzero(ranked.any(axis=0))
+			first = ranked[:, columns].argmax(axis=0)
+			columns = columns[np.lexsort((columns, ranks[first, columns], first))]
+
+		candidates = [self.candidates[col] for col in columns]
+		return Profile(ranks[:, columns], counts[keep], candidates, self.depth, self.keep_candidates)
+
+	def expand(self):
+		'''
+		expand the profile to one rankmap per voter
+
+		:returns: candidate to rank mapping per voter, duplicates allowed (list of dicts)
+		:rtype: list
+		'''
+		rankmaps = []
+		for rankmap, count in self:
+			rankmaps.extend([rankmap]*count)
+		return rankmaps
+
+class PositionHistogram:
+	'''
+	number of voters ranking each candidate at each position, row per candidate and column per rank (column 0 stays empty)
+	positional scores are prefix sums over a row, so l-bloc scores for any l cost O(m) once the histogram is built
+
+	:param counts: number of voters per candidate and rank (numpy.ndarray)
+	:param candidates: candidate index of every row (list)
+	:param depth: number of ranks kept per vote if the votes are truncated, None for complete votes (int)
+	'''
+	def __init__(self, counts, candidates, depth=None):
+		self.counts = counts
+		self.candidates = list(candidates)
+		self.depth = depth
+
+		# cumulative[c, p] is the number of voters ranking candidate c at position p or better
+		self.cumulative = np.cumsum(counts, axis=1)
+
+	@classmethod
+	def from_profile(cls, profile):
+		'''
+		build the histogram of a profile in a single pass over the rank matrix
+
+		:param profile: count-weighted voters preferences (Profile)
+
+		:returns: position histogram
+		:rtype: PositionHistogram
+		'''
+		numcandidates = len(profile.candidates)
+		ranked = profile.ranks != profile.unranked
+		maxrank = int(profile.ranks[ranked].max()) if ranked.any() else 0
+
+		# flat index candidate*(maxrank+1)+rank of every ranked entry, weighted by the count of its vote
+		columns = np.broadcast_to(np.arange(numcandidates, dtype=np.int64), profile.ranks.shape)[ranked]
+		index = columns*(maxrank+1) + profile.ranks[ranked]
+		weights = np.broadcast_to(profile.counts[:, np.newaxis], profile.ranks.shape)[ranked]
+		counts = np.bincount(index, weights=weights, minlength=numcandidates*(maxrank+1))
+
+		return cls(counts.astype(np.int64).reshape(numcandidates, maxrank+1), profile.candidates, profile.depth)
+
+	@classmethod
+	def from_rankcounts(cls, rankcounts, depth=None):
+		'''
+		build the histogram from aggregated votes
+
+		:param rankcounts: number of voters ranking a candidate at a rank {candidate:{rank:count}} (dict)
+		:param depth: number of ranks counted per vote if the votes are truncated (int)
+
+		:returns: position histogram
+		:rtype: PositionHistogram
+		'''
+		maxrank = max([max(ranks) for ranks in rankcounts.values() if ranks], default=0)
+		counts = np.zeros((len(rankcounts), maxrank+1), dtype=np.int64)
+		for row, ranks in enumerate(rankcounts.values()):
+			for rank, count in ranks.items():
+				counts[row, rank] = count
+
+		return cls(counts, rankcounts.keys(), depth)
+
+	def score_map(self, l):
+		'''
+		calculates scores for all candidates according to l-bloc rule
+
+		:param l: paramenter of l-bloc-rule (int)
+
+		:returns: candidates and their scores
+		:rtype: dict
+		'''
+		# truncated votes do not know whether a candidate is ranked below their depth
+		if self.depth is not None and l > self.depth:
+			raise ValueError("votes are truncated after rank %d, cannot score l = %d" % (self.depth, l))
+
+		maxrank = self.counts.shape[1]-1
+		return dict(zip(self.candidates, self.cumulative[:, max(min(l, maxrank), 0)].tolist()))
+
+	def positional_scores(self, scorevec):
+		'''
+		calculates scores for all candidates according to a positional scoring rule
+
+		:param scorevec: score of every position, scorevec[0] for rank 1 (list)
+
+		:returns: candidates and their scores
+		:rtype: dict
+		'''
+		maxrank = self.counts.shape[1]-1
+
+		# positions without a score give zero points
+		vector = np.zeros(maxrank+1, dtype=np.int64)
+		used = min(len(scorevec), maxrank)
+		vector[1:used+1] = scorevec[:used]
+
+		if self.depth is not None and np.any(vector[self.depth+1:]):
+			raise ValueError("votes are truncated after rank %d, cannot score positions below" % self.depth)
+
+		return dict(zip(self.candidates, (self.counts @ vector).tolist()))
+
+	def borda_scores(self, numcandidates=None):
+		'''
+		calculates borda scores for all candidates, rank 1 gives numcandidates-1 points and the last rank 0
+
+		:param numcandidates: number of candidates, the number of rows if omitted (int)
+
+		:returns: candidates and their scores
+		:rtype: dict
+		'''
+		if numcandidates is None:
+			numcandidates = len(self.candidates)
+		return self.positional_scores([numcandidates-p for p in range(1, numcandidates+1)])
+
+class Utilities:
+	'''
+	manipulators utilities as a dense candidates x manipulators array, row i belongs to candidate i+1
+	indexing a candidate row gives the dictionary {manipulator_index:utility} used by the list representation
+
+	:param values: utility of every candidate for every manipulator (numpy.ndarray)
+	:param manipulators: voter index of every column (list)
+	'''
+	def __init__(self, values, manipulators):
+		self.values = values
+		self.manipulators = list(manipulators)
+
+	@classmethod
+	def from_dicts(cls, utilities):
+		'''
+		build utilities from the list representation
+
+		:param utilities: manipulators utilities {manipulator_index:utility} (list)
+
+		:returns: array-backed utilities
+		:rtype: Utilities
+		'''
+		manipulators = list(utilities[0].keys()) if utilities else []
+		values = np.array([[utility[manip] for manip in manipulators] for utility in utilities], dtype=np.int64)
+		return cls(values.reshape(len(utilities), len(manipulators)), manipulators)
+
+	def to_dicts(self):
+		'''
+		convert to the list representation
+
+		:returns: manipulators utilities {manipulator_index:utility}
+		:rtype: list
+		'''
+		return [self[i] for i in range(len(self))]
+
+	def rows(self, S):
+		'''
+		get the utility rows of candidates
+
+		:param S: candidate indices (list)
+
+		:returns: utilities of the candidates, one row per candidate
+		:rtype: numpy.ndarray
+		'''
+		return self.values[np.asarray(S, dtype=np.int64)-1]
+
+	def __getitem__(self, i):
+		return dict(zip(self.manipulators, self.values[i].tolist()))
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self[i]
+
+	def __len__(self):
+		return len(self.values)
+
+def as_profile(rankmaps):
+	'''
+	convert a list of rankmaps with one rankmap per voter into a profile, profiles are returned as they are
+
+	:param rankmaps: candidate to rank mapping per voter (list of dicts or Profile)
+
+	:returns: count-weighted profile
+	:rtype: Profile
+	'''
+	if isinstance(rankmaps, Profile):
+		return rankmaps
+	return Profile.from_rankmaps(rankmaps)
+
+def as_utilities(utilities):
+	'''
+	convert utilities in list representation into array-backed utilities, Utilities are returned as they are
+
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
+
+	:returns: array-backed utilities
+	:rtype: Utilities
+	'''
+	if isinstance(utilities, Utilities):
+		return utilities
+	return Utilities.from_dicts(utilities)
@@ -0,0 +1,306 @@
+import importlib.util
+import itertools
+import os
+import numpy as np
+from abc import ABC, abstractmethod
+
+BACKENDS = ("gurobi", "highs")
+
+# backends needing a license, processes solving with them are limited
+LICENSED = ("gurobi",)
+
+SENSES = ("<=", ">=", "==")
+
+def default_backend():
+	'''
+	determine the backend used if none is given, $MANIPLIB_SOLVER or gurobi if gurobipy is installed and highs otherwise
+
+	:returns: "gurobi" or "highs"
+	:rtype: str
+	'''
+	backend = os.environ.get("MANIPLIB_SOLVER")
+	if backend:
+		return backend
+	return "gurobi" if importlib.util.find_spec("gurobipy") is not None else "highs"
+
+def new_model(name, backend=None, presolve=True):
+	'''
+	create an empty integer linear program
+
+	:param name: name of the model (str)
+	:param backend: "gurobi" or "highs" (scipy.optimize.milp), default_backend if omitted (str)
+	:param presolve: let the solver presolve the model (bool)
+
+	:returns: model
+	:rtype: GurobiModel or HighsModel
+	'''
+	if backend is None:
+		backend = default_backend()
+	if backend == "gurobi":
+		return GurobiModel(name, presolve)
+	if backend == "highs":
+		return HighsModel(name, presolve)
+	raise ValueError("unknown solver backend %s" % backend)
+
+class MILPModel(ABC):
+	'''
+	integer linear program with non-negative integer variables, independent of the solver
+	variables are column indices, linear expressions are lists of (coefficient, variable) tuples in which variables may repeat
+	constraints can be named to change their right-hand side between solves
+
+	:param name: name of the model (str)
+	:param presolve: let the solver presolve the model (bool)
+	'''
+	def __init__(self, name, presolve=True):
+		self.name = name
+		self.presolve = presolve
+		self.num_vars = 0
+		self.num_constrs = 0
+
+		# variables by name, see add_vars
+		self.vars = {}
+
+	def add_var(self, name, ub=None):
+		'''
+		add a variable
+
+		:param name: name of the variable (str)
+		:param ub: upper bound, unbounded if omitted (int)
+
+		:returns: variable
+		:rtype: int
+		'''
+		var = self.add_column(name, ub)
+		self.vars[name] = var
+		return var
+
+	def add_vars(self, shape, name, ub=None):
+		'''
+		add a variable for every index of the shape, like gurobipy's Model.addVars
+
+		:param shape: size of every dimension, or a list of the index tuples to add variables for (tuple or list)
+		:param name: name of the variables, an index is appended to it like "X[1,2]" (str)
+		:param ub: upper bounds by index, variables without one are unbounded (dict)
+
+		:returns: variables by index, indices are ints for one dimension of a shape and tuples otherwise
+		:rtype: dict
+		'''
+		if isinstance(shape, list):
+			indices = shape
+		else:
+			indices = itertools.product(*[range(size) for size in shape])
+
+		variables = {}
+		for index in indices:
+			key = index[0] if isinstance(shape, tuple) and len(shape) == 1 else index
+			bound = ub.get(key) if ub is not None else None
+			variables[key] = self.add_column(name + "[" + ",".join([str(i) for i in index]) + "]", bound)
+		self.vars[name] = variables
+		return variables
+
+	@abstractmethod
+	def add_column(self, name, ub=None):
+		'''
+		add a variable to the solver's model
+
+		:param name: name of the variable (str)
+		:param ub: upper bound, unbounded if omitted (int)
+
+		:returns: variable
+		:rtype: int
+		'''
+
+	@abstractmethod
+	def add_constr(self, terms, sense, rhs, name=None):
+		'''
+		add the constraint terms sense rhs
+
+		:param terms: linear expression (list of tuples)
+		:param sense: "<=", ">=" or "==" (str)
+		:param rhs: right-hand side (int)
+		:param name: name to change the right-hand side by, see set_rhs (str)
+		'''
+
+	@abstractmethod
+	def set_rhs(self, name, rhs):
+		'''
+		change the right-hand side of a named constraint
+
+		:param name: name of the constraint (str)
+		:param rhs: right-hand side (int)
+		'''
+
+	@abstractmethod
+	def rhs(self, name):
+		'''
+		get the right-hand side of a named constraint
+
+		:param name: name of the constraint (str)
+
+		:returns: right-hand side
+		:rtype: int
+		'''
+
+	@abstractmethod
+	def set_objective(self, terms, maximize=True):
+		'''
+		set the objective, models without one are solved for any feasible solution
+
+		:param terms: linear expression (list of tuples)
+		:param maximize: maximize, minimize otherwise (bool)
+		'''
+
+	@abstractmethod
+	def optimize(self):
+		'''
+		solve the model
+
+		:returns: True if an optimal solution was found
+		:rtype: bool
+		'''
+
+	@abstractmethod
+	def value(self, var):
+		'''
+		value of a variable in the solution found by optimize
+
+		:param var: variable (int)
+
+		:returns: value
+		:rtype: int
+		'''
+
+	@abstractmethod
+	def warm_start(self):
+		'''
+		start the next solve from the solution found by optimize
+		'''
+
+class GurobiModel(MILPModel):
+	'''
+	MILPModel solved by the Gurobi Optimizer, which needs a license
+	'''
+	def __init__(self, name, presolve=True):
+		super().__init__(name, presolve)
+
+		import gurobipy
+		self.gurobipy = gurobipy
+		self.model = gurobipy.Model(name)
+		self.model.setParam("OutputFlag", False)
+		if not presolve:
+			self.model.setParam("Presolve", False)
+
+		self.columns = []
+		self.constrs = {}
+		self.senses = {"<=": gurobipy.GRB.LESS_EQUAL, ">=": gurobipy.GRB.GREATER_EQUAL, "==": gurobipy.GRB.EQUAL}
+
+	def add_column(self, name, ub=None):
+		bound = self.gurobipy.GRB.INFINITY if ub is None else ub
+		self.columns.append(self.model.addVar(ub=bound, vtype=self.gurobipy.GRB.INTEGER, name=name))
+		self.num_vars += 1
+		return self.num_vars-1
+
+	def expression(self, terms):
+		return self.gurobipy.LinExpr([coef for coef, var in terms], [self.columns[var] for coef, var in terms])
+
+	def add_constr(self, terms, sense, rhs, name=None):
+		constr = self.model.addLConstr(self.expression(terms), self.senses[sense], rhs, name or "")
+		self.num_constrs += 1
+		if name is not None:
+			self.constrs[name] = constr
+
+	def set_rhs(self, name, rhs):
+		self.constrs[name].RHS = rhs
+
+	def rhs(self, name):
+		return self.constrs[name].RHS
+
+	def set_objective(self, terms, maximize=True):
+		self.model.setObjective(self.expression(terms), self.gurobipy.GRB.MAXIMIZE if maximize else self.gurobipy.GRB.MINIMIZE)
+
+	def optimize(self):
+		self.model.optimize()
+		return self.model.status == self.gurobipy.GRB.OPTIMAL
+
+	def value(self, var):
+		return int(round(self.columns[var].X))
+
+	def warm_start(self):
+		self.model.setAttr("Start", self.columns, self.model.getAttr("X", self.columns))
+
+class HighsModel(MILPModel):
+	'''
+	MILPModel solved by HiGHS through scipy.optimize.milp, which is open-source and needs no license
+	the constraint matrix is built on the first solve and kept while only right-hand sides change
+	'''
+	def __init__(self, name, presolve=True):
+		super().__init__(name, presolve)
+		self.rows = []
+		self.senses = []
+		self.rhss = []
+		self.constrs = {}
+		self.objective = []
+		self.maximize = True
+		self.upper = []
+		self.matrix = None
+		self.solution = None
+
+	def add_column(self, name, ub=None):
+		self.upper.append(np.inf if ub is None else ub)
+		self.num_vars += 1
+		self.matrix = None
+		return self.num_vars-1
+
+	def add_constr(self, terms, sense, rhs, name=None):
+		if sense not in SENSES:
+			raise ValueError("unknown constraint sense %s" % sense)
+		if name is not None:
+			self.constrs[name] = len(self.rows)
+		self.rows.append(list(terms))
+		self.senses.append(sense)
+		self.rhss.append(rhs)
+		self.num_constrs += 1
+		self.matrix = None
+
+	def set_rhs(self, name, rhs):
+		self.rhss[self.constrs[name]] = rhs
+
+	def rhs(self, name):
+		return self.rhss[self.constrs[name]]
+
+	def set_objective(self, terms, maximize=True):
+		self.objective = list(terms)
+		self.maximize = maximize
+
+	def optimize(self):
+		from scipy import sparse
+		from scipy.optimize import Bounds, LinearConstraint, milp
+
+		if self.matrix is None:
+			# repeated variables of a row are summed up by the conversion
+			entries = [(row, var, coef) for row, terms in enumerate(self.rows) for coef, var in terms]
+			rows, columns, coefs = zip(*entries) if entries else ((), (), ())
+			self.matrix = sparse.coo_array((coefs, (rows, columns)), shape=(len(self.rows), self.num_vars)).tocsr()
+
+		rhs = np.array(self.rhss, dtype=float)
+		lower = np.where([sense == "<=" for sense in self.senses], -np.inf, rhs)
+		upper = np.where([sense == ">=" for sense in self.senses], np.inf, rhs)
+
+		# milp minimizes
+		c = np.zeros(self.num_vars)
+		for coef, var in self.objective:
+			c[var] += -coef if self.maximize else coef
+
+		constraints = [LinearConstraint(self.matrix, lower, upper)] if self.rows else []
+		result = milp(c, integrality=np.ones(self.num_vars), bounds=Bounds(0, np.array(self.upper, dtype=float)), constraints=constraints,
+			options={"presolve": self.presolve})
+
+		self.solution = result.x if result.status == 0 else None
+		return self.solution is not None
+
+	def value(self, var):
+		return int(round(self.solution[var]))
+
+	def warm_start(self):
+		# scipy.optimize.milp doesn't take a start solution
+		pass
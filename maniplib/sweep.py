@@ -0,0 +1,74 @@
+from maniplib.manipulation_utils import *
+from maniplib import consistent_manipulation as cm
+from maniplib import inconsistent_manipulation as im
+from maniplib import data_preparation as dp
+from maniplib.knapsack import KnapsackMemo
+
+VARIANTS = ("consistent", "inconsistent", "egalitarian")
+
+def is_coalition(utilities):
+	'''
+	check if utilities describe a single coalition of manipulators rather than a list of coalitions
+
+	:param utilities: utilities of one coalition or list of utilities of several coalitions
+
+	:returns: True for a single coalition
+	:rtype: bool
+	'''
+	return isinstance(utilities, Utilities) or (len(utilities) > 0 and isinstance(utilities[0], dict))
+
+def sweep(profile, utilities, ls, ks, variants=("consistent", "inconsistent"), eval_fs=(utilitarian, candegal), stats=None):
+	'''
+	solves manipulations for a grid of parameters on the same election and yields one record per grid cell
+	the nonmanipulative votes are scored once per coalition and l, and scores, strength orders, distinguished candidates, candidate values and knapsack tables are shared by all cells using them
+
+	:param profile: all votes including the manipulators (list of dicts or Profile)
+	:param utilities: manipulators utilities of one coalition, or a list of them to sweep over coalition sizes (list or Utilities)
+	:param ls: parameters of l-bloc rule (list)
+	:param ks: winning egroup sizes (list)
+	:param variants: manipulation variants out of "consistent", "inconsistent" and "egalitarian" (tuple)
+	:param eval_fs: evaluation functions for the consistent and inconsistent variant (tuple)
+	:param stats: counters of all inconsistent and egalitarian manipulations are added to this dict (dict)
+
+	:returns: records with the keys coalition, r, l, k, variant, eval_f, X, eval, S and replaced, coalitions outermost and variants innermost
+	:rtype: generator of dicts
+	'''
+	for variant in variants:
+		if variant not in VARIANTS:
+			raise ValueError("unknown manipulation variant %s" % variant)
+
+	if "egalitarian" in variants:
+		# needs a MILP solver, only imported if requested
+		from maniplib import egalitarian as eg
+
+	coalitions = [utilities] if is_coalition(utilities) else utilities
+	profile = as_profile(profile)
+
+	for coalition, utilities in enumerate(coalitions):
+		r = len(utilities[0])
+
+		# the histogram of the remaining votes is built once, every l is a prefix sum lookup
+		non_manip = dp.get_nonmanipulative_votes(profile, utilities)
+
+		# candidate values don't depend on l, knapsacks of the same items are shared by all cells
+		value_maps = {}
+		memo = KnapsackMemo()
+
+		for l in ls:
+			context = ManipulationContext(l, non_manip, utilities, value_maps)
+
+			for k in ks:
+				for variant in variants:
+					if variant == "egalitarian":
+						X, eval_v, S, replaced = eg.egalitarian_manipulation(l, k, r, non_manip, utilities, context, stats)
+						yield {"coalition": coalition, "r": r, "l": l, "k": k, "variant": variant, "eval_f": "egalitarian",
+							"X": X, "eval": eval_v, "S": S, "replaced": replaced}
+						continue
+
+					for eval_f in eval_fs:
+						if variant == "consistent":
+							X, eval_v, S, replaced = cm.consistent_manipulation(l, k, non_manip, utilities, eval_f, context)
+						else:
+							X, eval_v, S, replaced = im.manipulation(l, k, non_manip, utilities, eval_f, context, stats, memo)
+						yield {"coalition": coalition, "r": r, "l": l, "k": k, "variant": variant, "eval_f": eval_f.__name__,
+							"X": X, "eval": eval_v, "S": S, "replaced": replaced}
@@ -1,5 +1,5 @@
-from gurobipy import *
 from maniplib.manipulation_utils import *
+from maniplib.solvers import new_model
 
 def get_candidate_indices(T, candidates, m):
 	'''
@@ -7,7 +7,7 @@ def get_candidate_indices(T, candidates, m):
 
 	:param T: types, tuples of utility values (list)
 	:param candidates: all candidate indices (list)
-	:param m: model
+	:param m: solved model (MILPModel)
 
 	:return: candidate indices
 	:rtype: list
@@ -20,7 +20,7 @@ def get_candidate_indices(T, candidates, m):
 	for idx, type_vector in enumerate(T):
 
 		# get solution count for each type
-		value = int(m.getVarByName("X["+str(idx)+"]").X)
+		value = m.value(m.vars["X"][idx])
 
 		# add l candidates of this type the solution
 		# for two candidates of the same type, the one that appears first will be chosen
@@ -36,13 +36,14 @@ def get_candidate_indices(T, candidates, m):
 	return solution
 
 
-def egal_opt(utilities, r, k):
+def egal_opt(utilities, r, k, backend=None):
 	'''
 	egalitarian optimistic tie-breaking
 
-	:param utilities: manipulators utilities {manipulator_index:utility} (list)
+	:param utilities: manipulators utilities {manipulator_index:utility} (list or Utilities)
 	:param r: number of manipulators (int)
 	:param k: egroup-size (int)
+	:param backend: solver, see solvers.new_model (str)
 
 	:return: winning candidate indices from utilities
 	:rtype: list
@@ -52,24 +53,23 @@ def egal_opt(utilities, r, k):
 
 	# Create a new model with variable s that has to be maximized, decision vector X
 	# X[i] indicates the number of candidates of type T[i] in an optimal k-egroup
-	m = Model("tb_egal")
-	m.setParam( 'OutputFlag', False )
-	s = m.addVar(vtype=GRB.INTEGER, name="s")  
-	X = m.addVars(t, vtype=GRB.INTEGER, name="X")
+	m = new_model("tb_egal", backend)
+	s = m.add_var("s")
+	X = m.add_vars((t,), "X")
 
 	# Set objective: maximization of s
-	m.setObjective(s, GRB.MAXIMIZE)
+	m.set_objective([(1, s)], maximize=True)
 
 	# Add constraint: for type T[i]: X[i] <= T_count[i]
 	for i in range(t):
-		m.addConstr(X[i] <= T_count[i])
+		m.add_constr([(1, X[i])], "<=", T_count[i])
 
 	# Add constraint: sum of all selected types equals k
-	m.addConstr(sum([X[i] for i in range(t)]) == k)
+	m.add_constr([(1, X[i]) for i in range(t)], "==", k)
 
 	#Add constraint: last constraint TODO: add description
 	for l in range(r):
-		m.addConstr(sum([X[i]*T[i][l] for i in range(t)]) >= s)  
+		m.add_constr([(T[i][l], X[i]) for i in range(t)] + [(-1, s)], ">=", 0)
 
 	# Optimize model
 	m.optimize()
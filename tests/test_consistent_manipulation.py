@@ -0,0 +1,15 @@
+from maniplib import consistent_manipulation as cm
+from maniplib import data_preparation as dp
+from maniplib.manipulation_utils import *
+
+def test_candidate_only_ranked_by_manipulator():
+	# candidate 5 is only ranked by the manipulator, voter 0, so it is missing from the nonmanipulative strength order
+	rankmaps = [{1: 1, 2: 2, 5: 3}, {4: 1, 2: 2}, {2: 1}, {1: 1, 2: 2}, {2: 1, 3: 2}]
+	utilities = [{0: 3}, {0: 2}, {0: 0}, {0: 0}, {0: 1}]
+	non_manip = dp.get_nonmanipulative_votes(rankmaps, utilities)
+
+	context = ManipulationContext(2, non_manip, utilities)
+	assert 5 not in context.strength_order
+
+	assert cm.consistent_manipulation(2, 2, non_manip, utilities, utilitarian) == ([2, 1], 5, [2, 1], 0)
+	assert cm.consistent_manipulation(2, 2, non_manip, utilities, utilitarian, context) == ([2, 1], 5, [2, 1], 0)
@@ -0,0 +1,144 @@
+import io
+import os
+import pytest
+from maniplib import data_preparation as dp
+from maniplib import consistent_manipulation as cm
+from maniplib import inconsistent_manipulation as im
+from maniplib.manipulation_utils import *
+
+# {1,4} is a tied group crossing rank 2, 5 is only ranked behind rank 2 and 6 first appears at rank 5 of the fourth record
+ELECTION = """6
+1,a
+2,b
+3,c
+4,d
+5,e
+6,f
+9,9,5
+2,3,2,{1,4},5
+1,2,{4,1},3
+3,1,3
+1,4,2,5,1,6
+2,1,3,2
+"""
+
+def parse(text, l=None):
+	return dp.read_profile(io.StringIO(text), l)
+
+@pytest.mark.parametrize("l", range(1, 7))
+def test_truncated_parse_matches_complete_parse(l):
+	candmap, complete, numvoters = parse(ELECTION)
+	truncated_candmap, truncated, truncated_numvoters = parse(ELECTION, l)
+	assert (truncated_candmap, truncated_numvoters) == (candmap, numvoters)
+	assert truncated.depth == l
+
+	# same candidates in the same order, so ties are broken the same way
+	assert truncated.candidates == complete.candidates == [3, 2, 1, 4, 5, 6]
+	assert list(get_score_map(l, truncated).items()) == list(get_score_map(l, complete).items())
+
+	utilities = dp.utilities_borda_voters(complete, [1, 6], len(candmap))
+	for k in range(1, 5):
+		assert im.manipulation(l, k, truncated, utilities, utilitarian) == im.manipulation(l, k, complete, utilities, utilitarian)
+		assert cm.consistent_manipulation(l, k, truncated, utilities, utilitarian) == cm.consistent_manipulation(l, k, complete, utilities, utilitarian)
+
+@pytest.mark.parametrize("l", range(1, 7))
+def test_truncated_parse_without_manipulators(l):
+	candmap, complete, numvoters = parse(ELECTION)
+	truncated = parse(ELECTION, l)[1]
+
+	# the second and the last record are not cast anymore, the complete records left still rank every candidate
+	utilities = dp.utilities_borda_voters(complete, [2, 7, 8], len(candmap))
+	non_manip = dp.get_nonmanipulative_votes(complete, utilities)
+	truncated_non_manip = dp.get_nonmanipulative_votes(truncated, utilities)
+	assert truncated_non_manip.candidates == non_manip.candidates
+	for k in range(1, 5):
+		assert im.manipulation(l, k, truncated_non_manip, utilities, utilitarian) == im.manipulation(l, k, non_manip, utilities, utilitarian)
+
+def test_truncated_parse_without_complete_votes():
+	candmap, complete, numvoters = parse(ELECTION)
+	truncated = parse(ELECTION, 2)[1]
+
+	# only the removed voter ranks 6 in a complete record, the last record may rank it behind 2
+	utilities = dp.utilities_borda_voters(complete, [6], len(candmap))
+	assert 6 not in dp.get_nonmanipulative_votes(complete, utilities).candidates
+	with pytest.raises(ValueError):
+		dp.get_nonmanipulative_votes(truncated, utilities)
+
+def test_truncated_parse_of_unranked_candidate():
+	# f is never ranked, so every record is read completely
+	election = ELECTION.replace(",6\n", "\n")
+	candmap, truncated, numvoters = parse(election, 2)
+	assert truncated.depth is None
+	assert truncated.candidates == parse(election)[1].candidates == [3, 2, 1, 4, 5]
+
+def test_cached_dataset_matches_parse(tmp_path):
+	path = tmp_path / "election.toc"
+	path.write_text(ELECTION)
+
+	# the complete votes are cached first, they must not serve the truncated requests
+	for l in (None, 2, 4, None, 2):
+		candmap, profile, numvoters = dp.dataset_from_file(str(path), l)
+		cached_candmap, cached, cached_numvoters = dp.dataset_from_file(str(path), l, cache=True)
+		assert (cached_candmap, cached_numvoters) == (candmap, numvoters)
+		assert (cached.candidates, cached.depth, cached.keep_candidates) == (profile.candidates, profile.depth, profile.keep_candidates)
+		assert (cached.ranks == profile.ranks).all() and (cached.counts == profile.counts).all()
+
+	# one generation per depth
+	generations = sorted([name.rsplit("-", 1)[0] for name in os.listdir(str(path) + ".profile") if name.startswith("generation-")])
+	assert generations == ["generation-complete", "generation-l2", "generation-l4"]
+
+MALFORMED = {
+	"candidate without name": ELECTION.replace("2,b\n", "2\n"),
+	"header without unique orders": ELECTION.replace("9,9,5", "9,9"),
+	"candidate not a number": ELECTION.replace("3,1,3\n", "3,1,x\n"),
+	"record without count": ELECTION.replace("3,1,3\n", "3\n"),
+	"votes not accounted for": ELECTION.replace("9,9,5", "9,10,5"),
+	"empty file": "",
+}
+
+@pytest.mark.parametrize("name", MALFORMED)
+@pytest.mark.parametrize("l", [None, 2])
+def test_malformed_file(name, l):
+	with pytest.raises(ValueError):
+		parse(MALFORMED[name], l)
+
+@pytest.mark.parametrize("l", [None, 2])
+def test_truncated_file(l):
+	# a record ends within a tied group, the file ends before the records counted in the header or within the header
+	with pytest.raises(ValueError):
+		parse(ELECTION.replace("2,3,2,{1,4},5", "2,3,2,{1,4"), l)
+	with pytest.raises(ValueError):
+		parse(ELECTION[:ELECTION.index("2,1,3,2")], l)
+	with pytest.raises(ValueError):
+		parse(ELECTION[:ELECTION.index("6,f")], l)
+
+def write_corpus(directory):
+	paths = []
+	for name, text in [("a.toc", ELECTION), ("broken.toc", MALFORMED["record without count"]), ("c.toc", ELECTION.replace("9,9,5\n2,3,2,{1,4},5\n", "7,7,4\n"))]:
+		path = directory / name
+		path.write_text(text)
+		paths.append(str(path))
+	return paths
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_load_corpus_errors(tmp_path, workers):
+	paths = write_corpus(tmp_path)
+	pattern = str(tmp_path / "*.toc")
+
+	with pytest.raises(ValueError):
+		list(dp.load_corpus(pattern, workers))
+
+	skipped = dict(dp.load_corpus(pattern, workers, errors="skip"))
+	assert sorted(skipped) == [paths[0], paths[2]]
+	for path in skipped:
+		assert skipped[path][0] == parse(ELECTION)[0]
+		assert skipped[path][1].candidates == dp.dataset_from_file(path)[1].candidates
+	assert [skipped[path][2] for path in sorted(skipped)] == [9, 7]
+
+	returned = dict(dp.load_corpus(paths, workers, l=2, errors="return"))
+	assert sorted(returned) == sorted(paths)
+	assert isinstance(returned[paths[1]], ValueError)
+	assert returned[paths[0]][1].depth == 2
+
+	with pytest.raises(ValueError):
+		list(dp.load_corpus(paths, workers, errors="ignore"))
@@ -0,0 +1,141 @@
+import http.server
+import io
+import threading
+import pytest
+import requests
+from maniplib import data_preparation as dp
+from maniplib.http_cache import DownloadCache
+from test_data_preparation import ELECTION
+
+class Handler(http.server.BaseHTTPRequestHandler):
+	'''
+	serves the resources of the server, answers conditional requests with 304 if the resource is unchanged
+	'''
+	def do_GET(self):
+		etag = self.headers.get("If-None-Match")
+		modified = self.headers.get("If-Modified-Since")
+		self.server.log.append((self.path, etag, modified))
+
+		if self.path not in self.server.resources:
+			self.send_error(404)
+			return
+		body, resource_etag, resource_modified = self.server.resources[self.path]
+
+		# the ETag decides if the resource has one
+		if (resource_etag is not None and etag == resource_etag) or (resource_etag is None and resource_modified is not None and modified == resource_modified):
+			self.send_response(304)
+			self.end_headers()
+			return
+
+		self.send_response(200)
+		if resource_etag is not None:
+			self.send_header("ETag", resource_etag)
+		if resource_modified is not None:
+			self.send_header("Last-Modified", resource_modified)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+@pytest.fixture
+def server():
+	server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+	server.resources = {}
+	server.log = []
+	server.url = "http://127.0.0.1:%d" % server.server_address[1]
+	thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+	thread.start()
+	yield server
+	server.shutdown()
+	server.server_close()
+
+def read(path):
+	with open(path, "rb") as f:
+		return f.read()
+
+def test_revalidate_with_etag(server, tmp_path):
+	server.resources["/a"] = (b"first", '"1"', "Mon, 12 Oct 2026 10:00:00 GMT")
+	cache = DownloadCache(str(tmp_path), requests.Session())
+
+	assert read(cache.fetch(server.url + "/a")) == b"first"
+	assert server.log[-1] == ("/a", None, None)
+
+	# unchanged, the server answers 304 and the cached body is kept
+	path = cache.fetch(server.url + "/a")
+	assert read(path) == b"first"
+	assert server.log[-1] == ("/a", '"1"', "Mon, 12 Oct 2026 10:00:00 GMT")
+
+	# changed, the body is downloaded again
+	server.resources["/a"] = (b"second", '"2"', "Tue, 13 Oct 2026 10:00:00 GMT")
+	assert cache.fetch(server.url + "/a") == path
+	assert read(path) == b"second"
+	assert server.log[-1] == ("/a", '"1"', "Mon, 12 Oct 2026 10:00:00 GMT")
+
+	cache.fetch(server.url + "/a")
+	assert server.log[-1] == ("/a", '"2"', "Tue, 13 Oct 2026 10:00:00 GMT")
+	assert read(path) == b"second"
+	assert len(server.log) == 4
+
+def test_revalidate_with_last_modified(server, tmp_path):
+	server.resources["/b"] = (b"first", None, "Mon, 12 Oct 2026 10:00:00 GMT")
+	cache = DownloadCache(str(tmp_path), requests.Session())
+
+	path = cache.fetch(server.url + "/b")
+	assert read(cache.fetch(server.url + "/b")) == b"first"
+	assert server.log[-1] == ("/b", None, "Mon, 12 Oct 2026 10:00:00 GMT")
+
+	server.resources["/b"] = (b"second", None, "Tue, 13 Oct 2026 10:00:00 GMT")
+	assert read(cache.fetch(server.url + "/b")) == b"second"
+	assert read(path) == b"second"
+
+def test_without_validators(server, tmp_path):
+	# nothing to revalidate with, every fetch downloads the body
+	server.resources["/c"] = (b"first", None, None)
+	cache = DownloadCache(str(tmp_path), requests.Session())
+	cache.fetch(server.url + "/c")
+	server.resources["/c"] = (b"second", None, None)
+	assert read(cache.fetch(server.url + "/c")) == b"second"
+	assert server.log == [("/c", None, None), ("/c", None, None)]
+
+def test_offline(server, tmp_path):
+	server.resources["/a"] = (b"first", '"1"', None)
+	path = DownloadCache(str(tmp_path), requests.Session()).fetch(server.url + "/a")
+
+	# the offline cache serves the cached body without asking the server, even if it changed
+	server.resources["/a"] = (b"second", '"2"', None)
+	offline = DownloadCache(str(tmp_path), requests.Session(), offline=True)
+	assert offline.fetch(server.url + "/a") == path
+	assert read(path) == b"first"
+	with pytest.raises(FileNotFoundError):
+		offline.fetch(server.url + "/missing")
+	assert len(server.log) == 1
+
+def test_missing_resource(server, tmp_path):
+	cache = DownloadCache(str(tmp_path), requests.Session())
+	with pytest.raises(requests.HTTPError):
+		cache.fetch(server.url + "/missing")
+
+	# a failed download leaves no entry behind
+	with pytest.raises(FileNotFoundError):
+		DownloadCache(str(tmp_path), offline=True).fetch(server.url + "/missing")
+
+def test_dataset_from_url(server, tmp_path):
+	server.resources["/election.toc"] = (ELECTION.encode("utf-8"), '"1"', None)
+	cache = DownloadCache(str(tmp_path), requests.Session())
+	url = server.url + "/election.toc"
+
+	candmap, profile, numvoters = dp.read_profile(io.StringIO(ELECTION))
+	for l in (None, 2, None):
+		cached_candmap, cached, cached_numvoters = dp.dataset_from_url(url, l, cache)
+		assert (cached_candmap, cached_numvoters) == (candmap, numvoters)
+		assert cached.candidates == profile.candidates
+	assert dp.dataset_from_url(url)[0] == candmap
+
+	# a changed download is parsed again instead of serving the cached profile
+	election = ELECTION.replace("9,9,5\n2,3,2,{1,4},5\n", "7,7,4\n")
+	server.resources["/election.toc"] = (election.encode("utf-8"), '"2"', None)
+	cached_candmap, cached, cached_numvoters = dp.dataset_from_url(url, None, cache)
+	assert cached_numvoters == 7
+	assert cached.candidates == dp.read_profile(io.StringIO(election))[1].candidates
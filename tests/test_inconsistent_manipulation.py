@@ -0,0 +1,99 @@
+import random
+import pytest
+from maniplib import data_preparation as dp
+from maniplib import inconsistent_manipulation as im
+from maniplib.manipulation_utils import *
+from test_knapsack import brute_force
+
+def random_election(trial):
+	'''
+	random rankmaps of up to 8 voters over up to 7 candidates, not every voter ranks every candidate, with 1 to 3 manipulators
+	'''
+	rnd = random.Random(trial)
+	numcandidates = rnd.randint(2, 7)
+	rankmaps = []
+	for v in range(rnd.randint(2, 8)):
+		order = rnd.sample(range(1, numcandidates+1), rnd.randint(1, numcandidates))
+		rankmaps.append({cand: rank+1 for rank, cand in enumerate(order)})
+
+	random.seed(trial)
+	utilities = dp.utilities_borda_random(rankmaps, rnd.randint(1, min(3, len(rankmaps)-1)), numcandidates)
+	return rankmaps, utilities, numcandidates
+
+def unpruned_manipulation(l, k, non_manip, utilities, eval_f):
+	'''
+	manipulation without bounds: every pair of c and z in the search order gets a brute-force knapsack, the first best solution is kept
+	'''
+	r = len(utilities[0])
+	context = ManipulationContext(l, non_manip, utilities)
+	scoremap = context.scoremap
+	strength_order = context.strength_order
+	score_index = context.score_index
+	value_map = context.values(eval_f)
+
+	max_eval = 0
+	max_X = []
+	max_S = []
+	for c in strength_order[:k+r*l]:
+		for z in range(scoremap[c], scoremap[c]+r):
+			k_star, s_star, C_star = im.knapsack_parameters(k, r, l, c, z, scoremap, score_index)
+			if C_star is None:
+				continue
+
+			if k_star != 0:
+				P = [value_map[cand] for cand in C_star]
+				W = im.compute_weights(scoremap, z, c, C_star)
+				X = brute_force(len(C_star), k_star, W, P, s_star)
+				if X is None or im.distribute_remaining(r, C_star, s_star, k_star, W, X, strength_order) > 0:
+					continue
+				X_res = [C_star[x] for x in X]
+				S = im.get_manip_kegroup(z, c, scoremap, X_res, score_index)
+			else:
+				S = strength_order[:k]
+				X_res = S
+
+			eval_v = eval_f(S, utilities)
+			if eval_v > max_eval:
+				max_eval = eval_v
+				max_X = X_res.copy()
+				max_S = S.copy()
+
+	return max_X, max_eval, max_S, check_manipul(k, max_S, strength_order)
+
+@pytest.mark.parametrize("eval_f", [utilitarian, candegal])
+def test_pruning_matches_unpruned_search(eval_f):
+	stats = {}
+	for trial in range(200):
+		rankmaps, utilities, numcandidates = random_election(trial)
+		non_manip = dp.get_nonmanipulative_votes(rankmaps, utilities)
+		for l in range(1, numcandidates+1):
+			for k in range(1, len(non_manip.candidates)+1):
+				assert im.manipulation(l, k, non_manip, utilities, eval_f, stats=stats) == unpruned_manipulation(l, k, non_manip, utilities, eval_f)
+
+	# the bounds did skip knapsacks
+	assert stats["knapsacks_pruned"] > 0
+
+@pytest.mark.parametrize("eval_f", [utilitarian, candegal])
+@pytest.mark.parametrize("epsilon", [0.2, 0.5, 0.9])
+def test_approximation_within_epsilon(eval_f, epsilon):
+	stats = {}
+	for trial in range(100):
+		rankmaps, utilities, numcandidates = random_election(trial)
+		non_manip = dp.get_nonmanipulative_votes(rankmaps, utilities)
+		for l in range(1, numcandidates+1):
+			for k in range(1, len(non_manip.candidates)+1):
+				X, eval_v, S, replaced, bound = im.manipulation(l, k, non_manip, utilities, eval_f, stats=stats, epsilon=epsilon)
+				exact_eval = unpruned_manipulation(l, k, non_manip, utilities, eval_f)[1]
+				assert eval_f(S, utilities) == eval_v
+				# an approximate choice of candidates can be better if the exact one leaves approvals that can't be distributed
+				assert (1-epsilon)*exact_eval <= eval_v <= bound
+				assert exact_eval <= bound
+
+	# the knapsacks were scaled down
+	assert stats["knapsacks_approximated"] > 0
+
+def test_approximation_needs_separable_evaluation():
+	rankmaps, utilities, numcandidates = random_election(0)
+	non_manip = dp.get_nonmanipulative_votes(rankmaps, utilities)
+	with pytest.raises(ValueError):
+		im.manipulation(1, 1, non_manip, utilities, lambda S, utilities: egalitarian(S, utilities, len(utilities[0])), epsilon=0.5)
@@ -0,0 +1,146 @@
+import itertools
+import random
+import pytest
+from maniplib.knapsack import *
+
+def brute_force(n, k, W, P, c):
+	'''
+	exact k-items Knapsack Problem by trying all k items, with the choice of e_kkp among solutions of the same value:
+	the lightest solution and of those the one with the earliest items, compared from the last item on
+
+	:returns: chosen items in descending order, None if no solution with a positive value is possible
+	:rtype: list, None
+	'''
+	best = None
+	for items in itertools.combinations(range(n), k):
+		value = sum([P[j] for j in items])
+		weight = sum([W[j] for j in items])
+		if value == 0 or weight > c:
+			continue
+		key = (-value, weight, sorted(items, reverse=True))
+		if best is None or key < best:
+			best = key
+	return best[2] if best is not None else None
+
+def random_instance(trial, max_value=5):
+	'''
+	random knapsack of up to 8 items, weights and values repeat and may be 0
+	'''
+	rnd = random.Random(trial)
+	n = rnd.randint(0, 8)
+	k = rnd.randint(0, n+1)
+	W = [rnd.randint(0, 6) for j in range(n)]
+	P = [rnd.randint(0, max_value) for j in range(n)]
+	return n, k, W, P, rnd.randint(-1, sum(W)+1)
+
+@pytest.mark.parametrize("trial", range(300))
+def test_profit_table(trial):
+	n, k, W, P, c = random_instance(trial)
+	assert e_kkp(n, k, W, P, c, engine="profit") == brute_force(n, k, W, P, c)
+
+	# a table answers every number of items up to its k and every weight constraint
+	shift, B = relative_weights("profit", W)
+	table = ProfitTable(k, B, P)
+	for k_q in range(k+1):
+		for c_q in range(-1, sum(W)+2):
+			assert table.solve(k_q, c_q - k_q*shift) == brute_force(n, k_q, W, P, c_q)
+
+@pytest.mark.parametrize("trial", range(300))
+def test_weight_table(trial):
+	n, k, W, P, c = random_instance(trial)
+	assert e_kkp(n, k, W, P, c, engine="weight") == brute_force(n, k, W, P, c)
+
+	# a table answers every number of items up to its k and every weight constraint up to its capacity
+	shift, B = relative_weights("weight", W)
+	table = WeightTable(k, B, P, c - k*shift)
+	for k_q in range(k+1):
+		for c_q in range(-1, c+1):
+			if table.serves(k_q, c_q - k_q*shift):
+				assert table.solve(k_q, c_q - k_q*shift) == brute_force(n, k_q, W, P, c_q)
+
+@pytest.mark.parametrize("trial", range(300))
+def test_chosen_engine(trial):
+	# large values make the table over weights the smaller one
+	n, k, W, P, c = random_instance(trial, max_value=1000)
+	stats = {}
+	assert e_kkp(n, k, W, P, c, stats=stats) == brute_force(n, k, W, P, c)
+	assert stats == {"knapsack_" + choose_engine(k, W, P, c): 1}
+
+@pytest.mark.parametrize("maxsize", [1, 2, 32])
+def test_memo_matches_unmemoized(maxsize):
+	memo = KnapsackMemo(maxsize)
+	stats = {}
+	for trial in range(200):
+		n, k, W, P, c = random_instance(trial)
+
+		# growing item lists extend cached tables, weights shifted by one and other k and c are served by them
+		rnd = random.Random(trial)
+		for query in range(12):
+			n_q = rnd.randint(0, n)
+			k_q = rnd.randint(0, n_q+1)
+			shift = rnd.randint(0, 1)
+			W_q = [w+shift for w in W[:n_q]]
+			c_q = rnd.randint(-1, sum(W_q)+1)
+			engine = rnd.choice([None, "profit", "weight"])
+			assert memo.solve(n_q, k_q, W_q, P, c_q, engine=engine, stats=stats) == e_kkp(n_q, k_q, W_q, P, c_q, engine=engine) == brute_force(n_q, k_q, W_q, P, c_q)
+			assert e_kkp(n_q, k_q, W_q, P, c_q, engine=engine, memo=memo) == brute_force(n_q, k_q, W_q, P, c_q)
+
+	assert len(memo.tables) <= maxsize
+	assert stats["knapsack_memo_hits"] > 0 and stats["knapsack_memo_extensions"] > 0
+
+@pytest.mark.parametrize("epsilon", [0.1, 0.3, 0.5, 0.9])
+@pytest.mark.parametrize("grouped", [False, True])
+def test_approx_within_epsilon(epsilon, grouped):
+	memo = KnapsackMemo()
+	for trial in range(300):
+		# large values are scaled down, small ones are solved exactly
+		n, k, W, P, c = random_instance(trial, max_value=1000 if trial % 2 else 5)
+		exact = brute_force(n, k, W, P, c)
+		chosen, bound = e_kkp_approx(n, k, W, P, c, epsilon, memo=memo, grouped=grouped)
+		if exact is None:
+			assert (chosen, bound) == (None, 0)
+			continue
+
+		# k distinct items within the weight constraint
+		assert chosen == sorted(set(chosen), reverse=True) and len(chosen) == k
+		assert sum([W[j] for j in chosen]) <= c
+
+		exact_value = sum([P[j] for j in exact])
+		value = sum([P[j] for j in chosen])
+		assert value >= (1-epsilon)*exact_value
+		assert value <= exact_value <= bound
+
+@pytest.mark.parametrize("epsilon", [0, 1, -0.5, 1.5])
+def test_approx_needs_epsilon_between_0_and_1(epsilon):
+	with pytest.raises(ValueError):
+		e_kkp_approx(3, 1, [1, 1, 1], [1, 2, 3], 3, epsilon)
+
+def test_split_groups():
+	groups = [list(range(size)) for size in range(12)]
+	parts = split_groups(groups)
+	for g, group in enumerate(groups):
+		sizes = [s for part_g, s in parts if part_g == g]
+		assert sum(sizes) == len(group)
+		# any number of items of the group is the size of some parts
+		sums = {sum(chosen) for m in range(len(sizes)+1) for chosen in itertools.combinations(sizes, m)}
+		assert sums == set(range(len(group)+1))
+
+@pytest.mark.parametrize("engine", [None, "profit", "weight"])
+def test_grouped_matches_ungrouped(engine):
+	memo = KnapsackMemo()
+	stats = {}
+	for trial in range(300):
+		# few weights and values, so many items are interchangeable
+		rnd = random.Random(trial)
+		n = rnd.randint(0, 12)
+		k = rnd.randint(0, n+1)
+		W = [rnd.randint(0, 2) for j in range(n)]
+		P = [rnd.randint(0, 2) for j in range(n)]
+		c = rnd.randint(-1, sum(W)+1)
+
+		exact = brute_force(n, k, W, P, c)
+		assert e_kkp_grouped(n, k, W, P, c, engine, stats) == e_kkp(n, k, W, P, c, engine) == exact
+		assert e_kkp_grouped(n, k, W, P, c, engine, stats, memo) == exact
+
+	assert stats["knapsack_items_grouped"] > 0
+	assert memo.hits > 0
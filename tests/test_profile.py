@@ -0,0 +1,25 @@
+from maniplib import data_preparation as dp
+from maniplib.profile import Profile
+
+def test_without_voters_keeps_order_of_first_appearance():
+	profile = Profile.from_rankmaps([{3: 1, 1: 2}, {2: 1, 4: 2}, {4: 1, 1: 2, 2: 3}])
+
+	# candidate 3 is only ranked by the removed voter, the others are ordered like in a profile of the remaining votes
+	remaining = profile.without_voters([0])
+	assert remaining.candidates == Profile.from_rankmaps([{2: 1, 4: 2}, {4: 1, 1: 2, 2: 3}]).candidates == [2, 4, 1]
+
+def test_without_all_voters():
+	rankmaps = [{1: 1, 2: 2}, {2: 1, 1: 2}]
+
+	# every voter is a manipulator
+	utilities = dp.utilities_borda_random(rankmaps, 2, 2)
+	non_manip = dp.get_nonmanipulative_votes(rankmaps, utilities)
+	assert len(non_manip) == 0
+	assert non_manip.numvoters == 0
+	assert non_manip.candidates == []
+	assert non_manip.expand() == []
+
+	# candidates that are kept stay without votes
+	kept = Profile.from_rankmaps(rankmaps, candidates=[1, 2, 3]).without_voters([0, 1])
+	assert kept.candidates == [1, 2, 3]
+	assert kept.ranks.shape == (0, 3)
@@ -0,0 +1,77 @@
+import random
+import pytest
+from maniplib import data_preparation as dp
+from maniplib import egalitarian as eg
+from maniplib import tie_breaking as tb
+from maniplib.manipulation_utils import *
+from maniplib.solvers import BACKENDS
+
+# the backends are compared with each other, gurobi needs gurobipy and highs scipy
+pytest.importorskip("gurobipy")
+pytest.importorskip("scipy")
+
+def random_profile(rnd, m, n):
+	'''
+	n random complete rankings of m candidates
+	'''
+	rankmaps = []
+	for v in range(n):
+		order = list(range(1, m+1))
+		rnd.shuffle(order)
+		rankmaps.append({cand: rank+1 for rank, cand in enumerate(order)})
+	return rankmaps
+
+def random_instance(trial):
+	'''
+	random votes, manipulators and parameters of an egalitarian manipulation
+	'''
+	rnd = random.Random(trial)
+	random.seed(trial)
+
+	m = rnd.randint(2, 15)
+	r = rnd.randint(1, 4)
+	rankmaps = random_profile(rnd, m, rnd.randint(r+1, 20))
+	utilities = dp.utilities_borda_random_udiff(rankmaps, r, m, rnd.randint(1, m))
+	non_manip = dp.get_nonmanipulative_votes(rankmaps, utilities)
+	return rnd.randint(1, m), rnd.randint(1, m), r, non_manip, utilities
+
+def least_satisfied(S, utilities):
+	'''
+	utility of the least satisfied manipulator summed over S, the objective of the tie-breaking ILP
+	'''
+	return min([sum([utilities[can-1][manip] for can in S]) for manip in utilities[0]])
+
+def optimistic_feasibility(l, k, r, rankmaps, utilities, backend):
+	'''
+	feasibility of the ILP of every iteration of egalitarian_manipulation
+	'''
+	context = ManipulationContext(l, rankmaps, utilities)
+	scoremap = context.scoremap
+	T, T_count, candidates = get_types(utilities)
+
+	feasible = []
+	for z in range(min(scoremap.values()), max(scoremap.values())+r+1):
+		num_plus = context.score_index.count_above(z)
+		if num_plus >= k:
+			continue
+		m = eg.build_optimistic_model(z, r, l, candidates, T, scoremap, context.score_index, backend=backend)
+		for p in range(k-num_plus):
+			for b in range(k-num_plus-p, r-num_plus-p+1):
+				feasible.append(eg.solve_optimistic_model(m, z, p, b, r, candidates, T, scoremap) is not None)
+	return feasible
+
+@pytest.mark.parametrize("trial", range(200))
+def test_backends_agree(trial):
+	l, k, r, non_manip, utilities = random_instance(trial)
+
+	# the tie-breaking ILP maximizes the utility of the least satisfied manipulator, both backends have to reach the same optimum
+	optimum = [least_satisfied(tb.egal_opt(utilities, r, k, backend), utilities) for backend in BACKENDS]
+	assert optimum[0] == optimum[1]
+
+	# the ILP of the manipulation has no objective, the backends have to agree on which iterations are feasible
+	feasible = [optimistic_feasibility(l, k, r, non_manip, utilities, backend) for backend in BACKENDS]
+	assert feasible[0] == feasible[1]
+
+	# its solutions are broken by group, so both backends find the same manipulation
+	manipulation = [eg.egalitarian_manipulation(l, k, r, non_manip, utilities, backend=backend) for backend in BACKENDS]
+	assert manipulation[0] == manipulation[1]